@@ -0,0 +1,13 @@
+import os
+
+# SERVER_MODE=asgi запускает воркеры uvicorn поверх asgi.py, иначе — синхронные воркеры над wsgi.py.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'recipe_site.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'recipe_site.wsgi:application'
@@ -0,0 +1,64 @@
+"""
+Нагрузочный сценарий для Locust (ставится отдельно: pip install locust).
+
+    python manage.py generate_data --users 100 --recipes 10000
+    python manage.py runserver            # или gunicorn recipe_site.wsgi:application
+    locust -f locustfile.py --host http://127.0.0.1:8000 --users 50 --spawn-rate 10
+
+Пользователи берутся из generate_data (префикс LOAD_PREFIX, по умолчанию load).
+"""
+import os
+import random
+import re
+
+from locust import HttpUser, between, task
+
+PREFIX = os.getenv('LOAD_PREFIX', 'load')
+USERS = int(os.getenv('LOAD_USERS', 100))
+PASSWORD = 'benchmark-password'
+RECIPE_LINK = re.compile(r'/recipe/(\d+)/')
+
+
+class Visitor(HttpUser):
+    """Анонимный посетитель: главная, рецепты, профили авторов."""
+    weight = 4
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        self.recipe_ids = []
+
+    @task(4)
+    def home(self):
+        response = self.client.get('/')
+        self.recipe_ids = RECIPE_LINK.findall(response.text) or self.recipe_ids
+
+    @task(6)
+    def recipe_detail(self):
+        if self.recipe_ids:
+            self.client.get(f'/recipe/{random.choice(self.recipe_ids)}/', name='/recipe/[id]/')
+
+    @task(2)
+    def user_profile(self):
+        self.client.get(f'/user/{PREFIX}_{random.randrange(USERS)}/', name='/user/[username]/')
+
+
+class Author(HttpUser):
+    """Авторизованный автор: свой профиль и страница добавления рецепта."""
+    weight = 1
+    wait_time = between(2, 5)
+
+    def on_start(self):
+        self.client.get('/login/')
+        self.client.post('/login/', {
+            'username': f'{PREFIX}_{random.randrange(USERS)}',
+            'password': PASSWORD,
+            'csrfmiddlewaretoken': self.client.cookies.get('csrftoken', ''),
+        })
+
+    @task(3)
+    def profile(self):
+        self.client.get('/profile/')
+
+    @task(1)
+    def add_recipe_form(self):
+        self.client.get('/add/')
@@ -38,16 +38,19 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'recipes.apps.RecipesConfig',
 ]
 
 MIDDLEWARE = [
+    'recipes.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'recipes.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -56,7 +59,7 @@ ROOT_URLCONF = 'recipe_site.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'recipes.metrics.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -71,11 +74,23 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'recipe_site.wsgi.application'
+ASGI_APPLICATION = 'recipe_site.asgi.application'
+
+# wsgi — синхронные воркеры gunicorn, asgi — воркеры uvicorn и асинхронные
+# версии публичных страниц (см. gunicorn.conf.py).
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+ASYNC_VIEWS = SERVER_MODE == 'asgi'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Соединения с Postgres не открываются заново на каждый запрос:
+# POSTGRES_POOL=1 — пул psycopg 3 на процесс (соединение берётся на время запроса);
+# иначе поток держит соединение POSTGRES_CONN_MAX_AGE секунд (0 — новое на каждый запрос).
+# Под ASGI постоянные соединения не переиспользуются между запросами — там нужен пул.
+POSTGRES_POOL = os.getenv('POSTGRES_POOL', '1' if ASYNC_VIEWS else '0') == '1'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -84,9 +99,59 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': 'db',
         'PORT': 5432,
+        # Пул несовместим с постоянными соединениями: соединения держит он сам.
+        'CONN_MAX_AGE': 0 if POSTGRES_POOL else int(os.getenv('POSTGRES_CONN_MAX_AGE', 60)),
+        # Перед повторным использованием соединение проверяется — обрыв не превращается в 500.
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                # Всего соединений не больше max_size × воркеры gunicorn — держите ниже max_connections.
+                'min_size': int(os.getenv('POSTGRES_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.getenv('POSTGRES_POOL_MAX_SIZE', 10)),
+                'timeout': float(os.getenv('POSTGRES_POOL_TIMEOUT', 10)),
+            },
+        } if POSTGRES_POOL else {},
     }
 }
 
+# Реплики только для чтения (потоковая репликация основной базы), через запятую.
+# Чтения GET-запросов расходятся по ним, запись и всё после неё — в default
+# (recipes.routers, recipes.middleware.ReplicaMiddleware).
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.getenv('POSTGRES_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['recipes.routers.ReplicaRouter']
+
+# Сколько секунд после записи сессия читает только основную базу — с запасом
+# на отставание реплик.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+
+# Cache
+# Локально и в тестах — память процесса; в продакшене задайте REDIS_URL.
+
+REDIS_URL = os.getenv('REDIS_URL')
+CACHE_BACKEND = ('django.core.cache.backends.redis.RedisCache' if REDIS_URL
+                 else 'django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': REDIS_URL or 'default',
+    },
+    'fragments': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': REDIS_URL or 'fragments',
+        'KEY_PREFIX': 'fragments',
+        'TIMEOUT': int(os.getenv('FRAGMENT_CACHE_TIMEOUT', 60 * 60)),
+    },
+}
+
+# Сколько секунд общие счётчики фасетов каталога (без фильтров) живут в кэше (0 — считать каждый запрос).
+FACETS_CACHE_TIMEOUT = int(os.getenv('FACETS_CACHE_TIMEOUT', 60 * 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -129,7 +194,45 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_REDIRECT_URL = '/'
 
+# ModelBackend остаётся в списке ради сессий, созданных до ProfileBackend: Django разлогинивает
+# сессию, если записанного в ней бэкенда нет в списке. Пароль проверяет только ProfileBackend.
+AUTHENTICATION_BACKENDS = [
+    'recipes.backends.ProfileBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Сессии читаются из кэша, а пишутся и в кэш, и в базу (переживают сброс кэша).
+# Истёкшие строки в базе удаляет prune_sessions — сервис session-cleanup в docker-compose.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+# Сколько секунд пользователь сессии с профилем живёт в кэше (0 — читать из базы каждый запрос);
+# сохранение пользователя или профиля сбрасывает запись раньше.
+USER_CACHE_TIMEOUT = int(os.getenv('USER_CACHE_TIMEOUT', 60 * 5))
+
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
+
+# Без DEBUG статика собирается collectstatic с хэшем содержимого в именах и готовыми
+# .gz рядом (nginx отдаёт их с бессрочным кэшем); в разработке манифеста нет.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': ('django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+                    else 'recipes.storage.CompressedManifestStaticFilesStorage'),
+    },
+}
+
+# Потоки фоновой обработки загруженных изображений (0 — обрабатывать синхронно).
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+# HTTP-кэш страниц: сколько секунд анонимные страницы рецептов и профилей живут
+# в браузере и в proxy_cache nginx, и куда слать запросы обновления кэша
+# (внутренний server nginx, пусто — не слать).
+ANONYMOUS_CACHE_MAX_AGE = int(os.getenv('ANONYMOUS_CACHE_MAX_AGE', 60))
+CACHE_PURGE_URL = os.getenv('CACHE_PURGE_URL', '')
+
+# Токен для /metrics/ (Prometheus: authorization: credentials); без токена метрики видят только сотрудники.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
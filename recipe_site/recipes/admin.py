@@ -1,16 +1,119 @@
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
 
-from .models import (Category, Ingredient, Recipe, RecipeCategory,
-                     RecipeIngredient, UserProfile)
+from .cache import reference_objects
+from .models import (Category, Ingredient, Recipe, RecipeIngredient,
+                     RecipeSummary, UserProfile)
+from .search import category_filter, cook_time_filter, recipe_text_filter
+
+# Ниже этого числа строк точный COUNT(*) дешёвый и оценка не нужна.
+ESTIMATED_COUNT_THRESHOLD = 100_000
+
+
+def estimated_count(queryset) -> int | None:
+    """
+    Число строк всей таблицы из статистики планировщика (pg_class.reltuples) — без чтения таблицы.
+
+    Только для PostgreSQL и только для queryset без фильтров; None — оценки нет
+    (таблица ещё не анализировалась или считать надо точно).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where or queryset.query.distinct:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                       [connection.ops.quote_name(queryset.model._meta.db_table)])
+        row = cursor.fetchone()
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор списков админки для больших таблиц: без фильтров число строк берётся из оценки
+    PostgreSQL, точный COUNT(*) — только для небольших таблиц и отфильтрованных списков.
+    Оценка может немного разойтись с реальностью — последняя страница тогда окажется короче
+    или пустой, админка в этом случае возвращает на первую.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+            return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Иначе при фильтре админка делает второй COUNT(*) по всей таблице ради «из N всего».
+    show_full_result_count = False
+    # Счётчики фасетов — по COUNT(*) на каждый вариант каждого фильтра.
+    show_facets = admin.ShowFacets.NEVER
+
+
+class CategoryListFilter(admin.SimpleListFilter):
+    """Фильтр по категории подзапросом по индексу (category, recipe): без JOIN по M2M и DISTINCT."""
+    title = 'категории'
+    parameter_name = 'category'
+
+    def lookups(self, request, model_admin):
+        return [(str(category.pk), category.name) for category in reference_objects(Category)]
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        if not self.value().isdigit():
+            raise IncorrectLookupParameters(self.value())
+        return queryset.filter(category_filter([int(self.value())]))
+
+
+class CookTimeListFilter(admin.SimpleListFilter):
+    """Корзины времени приготовления вместо SELECT DISTINCT cook_time по всей таблице."""
+    title = 'время приготовления'
+    parameter_name = 'cook_time'
+
+    def lookups(self, request, model_admin):
+        return [(str(limit), label) for limit, label in RecipeSummary.COOK_TIME_BUCKETS]
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        if not self.value().isdigit():
+            raise IncorrectLookupParameters(self.value())
+        return queryset.filter(cook_time_filter([int(self.value())]))
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
     list_display = ('title', 'author', 'cook_time', 'created_at')
-    list_filter = ('categories', 'cook_time')
-    search_fields = ('title', 'description', 'author__username')
+    list_select_related = ('author',)
+    list_filter = (CategoryListFilter, CookTimeListFilter)
+    # Описание поиска для админки; ищет get_search_results — по индексам, а не icontains.
+    search_fields = ('title', 'description', '=author__username')
+    search_help_text = 'Слова из названия или описания либо точный логин автора.'
+    raw_id_fields = ('author',)
     # filter_horizontal = ('categories',)
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Полнотекстовый индекс по названию и описанию (см. search.recipe_text_filter) или
+        точное имя автора: id автора ищется отдельным запросом по уникальному индексу,
+        и оба условия остаются на таблице рецептов — без JOIN и без дубликатов.
+        """
+        search_term = search_term.strip()
+        condition = recipe_text_filter(search_term)
+        if condition is None:
+            return queryset, False
+        author_id = User.objects.filter(username=search_term).values_list('pk', flat=True).first()
+        if author_id is not None:
+            condition |= Q(author_id=author_id)
+        return queryset.filter(condition), False
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -21,16 +124,24 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name',)
+    # icontains в PostgreSQL — UPPER(name) LIKE, его покрывает триграммный индекс ingredient_name_trgm_idx;
+    # этот же поиск обслуживает автодополнение ингредиента в RecipeIngredientAdmin.
     search_fields = ('name',)
 
 
 @admin.register(RecipeIngredient)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(LargeTableAdmin):
     list_display = ('recipe', 'ingredient', 'amount', 'unit')
+    list_select_related = ('recipe', 'ingredient')
     list_filter = ('unit',)
+    raw_id_fields = ('recipe',)
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(LargeTableAdmin):
     list_display = ('user', 'bio')
-    search_fields = ('user__username',)
+    list_select_related = ('user',)
+    # Точное совпадение идёт по уникальному индексу username, icontains читал бы всю таблицу.
+    search_fields = ('=user__username',)
+    raw_id_fields = ('user',)
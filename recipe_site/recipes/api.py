@@ -0,0 +1,151 @@
+"""
+JSON API v1 для мобильного клиента: список рецептов с курсором, рецепт, потоковая выгрузка.
+
+    GET /api/v1/recipes/?fields=id,title,cook_time&limit=50&after=<курсор>
+    GET /api/v1/recipes/<id>/?fields=title,ingredients
+    GET /api/v1/recipes/export/?fields=id,title  — NDJSON, по объекту в строке
+
+`fields` — разреженный набор полей: из базы читаются только нужные колонки, а связанные
+строки (автор, категории, ингредиенты) догружаются фиксированным числом запросов,
+только если поле запрошено.
+"""
+import orjson
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from .models import Category, Recipe, RecipeIngredient
+from .services import (RECIPES_PAGE_SIZE, page_queryset, split_page,
+                       streaming_content)
+
+API_MAX_PAGE_SIZE = 100
+EXPORT_CHUNK_SIZE = 1_000
+
+
+def image_variant_urls(variants: dict) -> dict:
+    return {extension: {width: default_storage.url(name) for width, name in sizes.items()}
+            for extension, sizes in variants.items() if extension != 'source'}
+
+
+# Поле ответа -> (колонки Recipe для only(), извлечение значения из рецепта).
+FIELDS = {
+    'id': ((), lambda recipe: recipe.pk),
+    'title': (('title',), lambda recipe: recipe.title),
+    'description': (('description',), lambda recipe: recipe.description),
+    'steps': (('steps',), lambda recipe: recipe.steps),
+    'cook_time': (('cook_time',), lambda recipe: recipe.cook_time),
+    'author': (('author__username',), lambda recipe: recipe.author.username),
+    'image': (('image',), lambda recipe: recipe.image.url if recipe.image else None),
+    'image_variants': (('image_variants',), lambda recipe: image_variant_urls(recipe.image_variants)),
+    'ingredient_count': (('ingredient_count',), lambda recipe: recipe.ingredient_count),
+    'categories': ((), lambda recipe: [category.name for category in recipe.categories.all()]),
+    'ingredients': ((), lambda recipe: [
+        {'id': item.ingredient_id, 'name': item.ingredient.name, 'amount': item.amount, 'unit': item.unit}
+        for item in recipe.ingredients.all()
+    ]),
+    'created_at': ((), lambda recipe: recipe.created_at),
+    'updated_at': (('updated_at',), lambda recipe: recipe.updated_at),
+}
+# Связанные строки: по одному запросу на поле для всей страницы (или пачки выгрузки).
+PREFETCHES = {
+    'categories': lambda: Prefetch('categories', queryset=Category.objects.only('name').order_by('name')),
+    'ingredients': lambda: Prefetch('ingredients', queryset=RecipeIngredient.objects
+                                    .select_related('ingredient').only('recipe', 'amount', 'unit', 'ingredient__name')
+                                    .order_by('pk')),
+}
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def parse_fields(request: HttpRequest) -> list[str]:
+    """`?fields=title,cook_time` -> список полей; без параметра — все поля."""
+    value = request.GET.get('fields')
+    if not value:
+        return list(FIELDS)
+    fields = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown or not fields:
+        raise FieldsError(f'Неизвестные поля: {", ".join(unknown)}. Доступны: {", ".join(FIELDS)}')
+    return fields
+
+
+def api_queryset(fields: list[str]):
+    """Только нужные колонки; автор — JOIN, категории и ингредиенты — по запросу на поле."""
+    # created_at и id нужны курсору пагинации всегда.
+    columns = {'created_at', *(column for name in fields for column in FIELDS[name][0])}
+    queryset = Recipe.objects.only(*columns)
+    if 'author' in fields:
+        queryset = queryset.select_related('author')
+    return queryset.prefetch_related(*(PREFETCHES[name]() for name in fields if name in PREFETCHES))
+
+
+def serialize(recipe: Recipe, fields: list[str]) -> dict:
+    return {name: FIELDS[name][1](recipe) for name in fields}
+
+
+def json_response(data, status: int = 200) -> HttpResponse:
+    # orjson сам сериализует datetime в ISO 8601 и в разы быстрее json.dumps.
+    return HttpResponse(orjson.dumps(data), status=status, content_type='application/json')
+
+
+def error(message: str, status: int) -> HttpResponse:
+    return json_response({'detail': message}, status=status)
+
+
+@require_GET
+def recipe_list(request: HttpRequest) -> HttpResponse:
+    """Страница рецептов, новые первыми: {"results": [...], "next": курсор или null}."""
+    try:
+        fields = parse_fields(request)
+        size = min(int(request.GET.get('limit') or RECIPES_PAGE_SIZE), API_MAX_PAGE_SIZE)
+    except FieldsError as exc:
+        return error(str(exc), 400)
+    except ValueError:
+        return error('limit должен быть целым числом.', 400)
+    if size < 1:
+        return error('limit должен быть положительным.', 400)
+    recipes, next_cursor = split_page(list(page_queryset(api_queryset(fields), request.GET.get('after'), size)), size)
+    return json_response({'results': [serialize(recipe, fields) for recipe in recipes], 'next': next_cursor})
+
+
+@require_GET
+def recipe_detail(request: HttpRequest, recipe_id: int) -> HttpResponse:
+    try:
+        fields = parse_fields(request)
+    except FieldsError as exc:
+        return error(str(exc), 400)
+    recipe = api_queryset(fields).filter(pk=recipe_id).first()
+    if recipe is None:
+        return error('Рецепт не найден.', 404)
+    return json_response(serialize(recipe, fields))
+
+
+def export_lines(fields: list[str], chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    NDJSON всего каталога. iterator(chunk_size) читает рецепты пачками (с prefetch на каждую
+    пачку), так что память не растёт с размером каталога: в ней одна пачка моделей и её строки,
+    которые уходят клиенту одним куском (под ASGI — через services.streaming_content).
+    """
+    lines = []
+    for recipe in api_queryset(fields).order_by('pk').iterator(chunk_size=chunk_size):
+        lines.append(orjson.dumps(serialize(recipe, fields), option=orjson.OPT_APPEND_NEWLINE))
+        if len(lines) == chunk_size:
+            yield b''.join(lines)
+            lines = []
+    if lines:
+        yield b''.join(lines)
+
+
+@require_GET
+def recipe_export(request: HttpRequest) -> HttpResponse:
+    try:
+        fields = parse_fields(request)
+    except FieldsError as exc:
+        return error(str(exc), 400)
+    response = StreamingHttpResponse(streaming_content(request, export_lines(fields)),
+                                     content_type='application/x-ndjson')
+    response['Content-Disposition'] = 'attachment; filename="recipes.ndjson"'
+    return response
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        # Порядок важен: сводка читает updated_at, который сдвигают обработчики кэша.
+        from . import (cache, http_cache,  # noqa: F401 — подключают сигналы
+                       images, search, summary)
@@ -0,0 +1,25 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+
+from .cache import cached_user
+
+
+class ProfileBackend(ModelBackend):
+    """
+    Пользователь сессии загружается сразу с профилем (шапка каждой страницы показывает аватар)
+    и берётся из общего кэша — см. recipes.cache.cached_user.
+    """
+
+    def get_user(self, user_id):
+        user = cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        """
+        Неверные логин или пароль завершают проверку: ModelBackend, оставленный в
+        AUTHENTICATION_BACKENDS для старых сессий, не хэширует тот же пароль второй раз.
+        """
+        user = super().authenticate(request, username=username, password=password, **kwargs)
+        if user is None and username is not None and password is not None:
+            raise PermissionDenied
+        return user
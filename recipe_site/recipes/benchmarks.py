@@ -0,0 +1,100 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+
+from .models import (Category, Ingredient, Recipe, RecipeCategory,
+                     RecipeIngredient, UserProfile)
+from .search import update_ingredient_counts, update_search_index
+from .summary import refresh_summaries
+
+WORDS = [
+    "борщ", "суп", "салат", "пирог", "котлеты", "каша", "блины", "запеканка", "рагу", "плов",
+    "курица", "говядина", "рыба", "грибы", "картофель", "сыр", "томаты", "тыква", "яблоки", "творог",
+]
+CATEGORY_NAMES = ["Завтрак", "Обед", "Ужин", "Десерт", "Выпечка", "Салаты", "Супы", "Напитки"]
+PASSWORD = 'benchmark-password'
+# Доля рецептов с каждым популярным ингредиентом (create_recipes, staples).
+STAPLE_SHARE = 0.5
+
+# Бюджеты представлений: максимум SQL-запросов (для авторизованного пользователя —
+# с сессией и пользователем вместе с профилем для шапки; у страниц с условным GET — плюс
+# запросы версии страницы; справочник категорий может быть ещё не загружен в процесс)
+# и p95 задержки в миллисекундах.
+VIEW_BUDGETS = {
+    'home': {'queries': 5, 'p95_ms': 50},
+    'recipe_detail': {'queries': 6, 'p95_ms': 50},
+    'profile': {'queries': 3, 'p95_ms': 50},
+    'user_profile': {'queries': 6, 'p95_ms': 50},
+    'add_recipe': {'queries': 3, 'p95_ms': 50},
+    'edit_recipe': {'queries': 7, 'p95_ms': 100},
+}
+
+
+def create_users(count: int, prefix: str = 'bench') -> list[User]:
+    """Пользователи с профилями; пароль у всех PASSWORD (хэшируется один раз)."""
+    password = make_password(PASSWORD)
+    users = User.objects.bulk_create(User(username=f'{prefix}_{i}', password=password) for i in range(count))
+    # bulk_create не шлёт post_save — профили создаём явно.
+    UserProfile.objects.bulk_create(UserProfile(user=user) for user in users)
+    return users
+
+
+def create_ingredients(count: int, prefix: str = 'bench') -> list[Ingredient]:
+    return Ingredient.objects.bulk_create(Ingredient(name=f'{prefix} ингредиент {i}') for i in range(count))
+
+
+def create_categories(prefix: str = 'bench') -> list[Category]:
+    return Category.objects.bulk_create(Category(name=f'{prefix} {name}') for name in CATEGORY_NAMES)
+
+
+def create_recipes(count: int, authors: list[User], ingredients=(), categories=(), per_recipe: int = 8,
+                   batch_size: int = 5_000, seed: int = 0, staples: int = 0) -> None:
+    """
+    Создаёт рецепты пачками вместе с ингредиентами, категориями, поисковым индексом и сводкой.
+
+    Первые `staples` ингредиентов — «соль и лук»: каждый попадает в рецепт с вероятностью
+    STAPLE_SHARE сверх `per_recipe` случайных из остальных.
+    """
+    rng = random.Random(seed)
+    staple_pool, ingredients = list(ingredients[:staples]), list(ingredients[staples:])
+    per_recipe = min(per_recipe, len(ingredients))
+    while count > 0:
+        chunk = min(batch_size, count)
+        recipes = Recipe.objects.bulk_create(
+            Recipe(title=' '.join(rng.sample(WORDS, 3)).capitalize(),
+                   description=' '.join(rng.choices(WORDS, k=20)),
+                   steps='\n'.join(rng.choices(WORDS, k=10)),
+                   cook_time=rng.randint(5, 180),
+                   author=rng.choice(authors))
+            for _ in range(chunk)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=rng.randint(1, 500))
+            for recipe in recipes
+            for ingredient in rng.sample(ingredients, per_recipe)
+            + [staple for staple in staple_pool if rng.random() < STAPLE_SHARE]
+        )
+        if categories:
+            RecipeCategory.objects.bulk_create(
+                RecipeCategory(recipe=recipe, category=category)
+                for recipe in recipes
+                for category in rng.sample(categories, rng.randint(1, 2))
+            )
+        if connection.vendor == 'postgresql':
+            # Ключи подбора берут частоты ингредиентов из статистики — на живой базе её
+            # обновляет автоанализ, здесь он не успел бы за пачками.
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {RecipeIngredient._meta.db_table}')
+        # bulk_create не шлёт post_save — индексируем пачку, считаем ингредиенты и строим сводку явно.
+        update_search_index([recipe.pk for recipe in recipes])
+        update_ingredient_counts([recipe.pk for recipe in recipes])
+        refresh_summaries([recipe.pk for recipe in recipes])
+        count -= chunk
+
+
+def percentile(sorted_values: list[float], share: float) -> float:
+    """Перцентиль по уже отсортированным значениям (ближайший ранг)."""
+    index = max(0, min(len(sorted_values) - 1, round(share * len(sorted_values)) - 1))
+    return sorted_values[index]
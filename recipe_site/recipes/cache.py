@@ -0,0 +1,170 @@
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (Category, Recipe, RecipeCategory, RecipeIngredient,
+                     UserProfile)
+from .services import bulk_write_in_progress
+
+FRAGMENT_CACHE = 'fragments'
+RECIPE_FRAGMENTS = ('card', 'detail', 'profile_row', 'public_row')
+# Небольшие справочники, которые целиком держатся в памяти процесса, и их порядок.
+REFERENCE_ORDERING = {Category: 'name'}
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_reference = {}  # модель -> (версия, список объектов)
+_reference_lock = threading.Lock()
+
+
+def fragment_cache():
+    return caches[FRAGMENT_CACHE]
+
+
+def fragment_key(name: str, recipe_id: int, version) -> str:
+    """Ключ фрагмента: имя, id рецепта и его версия (`updated_at`)."""
+    return f'recipe:{name}:{recipe_id}:{version.timestamp() if version else 0}'
+
+
+def record(event: str) -> None:
+    with _stats_lock:
+        _stats[event] += 1
+
+
+def fragment_cache_stats() -> dict[str, int]:
+    """Счётчики попаданий и промахов кэша фрагментов в текущем процессе."""
+    with _stats_lock:
+        return {'hits': _stats['hits'], 'misses': _stats['misses']}
+
+
+def invalidate_recipe(recipe_id: int, version) -> None:
+    fragment_cache().delete_many([fragment_key(name, recipe_id, version) for name in RECIPE_FRAGMENTS])
+
+
+def touch_recipe(recipe_id: int) -> None:
+    """Сбрасывает фрагменты рецепта и сдвигает его версию после изменения связанных строк."""
+    version = Recipe.objects.filter(pk=recipe_id).values_list('updated_at', flat=True).first()
+    if version is None:
+        return
+    invalidate_recipe(recipe_id, version)
+    Recipe.objects.filter(pk=recipe_id).update(updated_at=timezone.now())
+
+
+def reference_version_key(model) -> str:
+    return f'reference:{model._meta.label_lower}:version'
+
+
+def reference_objects(model) -> list:
+    """
+    Все строки справочника из памяти процесса (категории для чекбоксов формы и фасетов).
+
+    Актуальность сверяется с версией в общем кэше — одно обращение к кэшу вместо запроса
+    к базе; изменение справочника в любом процессе меняет версию и список перечитывается.
+    """
+    key = reference_version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    with _reference_lock:
+        cached = _reference.get(model)
+    if cached and cached[0] == version:
+        return cached[1]
+    # Из основной базы: список живёт под новой версией без срока, а реплика могла ещё не догнать изменение.
+    objects = list(model.objects.using(DEFAULT_DB_ALIAS).order_by(REFERENCE_ORDERING[model]))
+    with _reference_lock:
+        _reference[model] = (version, objects)
+    return objects
+
+
+def invalidate_reference(model) -> None:
+    cache.set(reference_version_key(model), uuid.uuid4().hex, timeout=None)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reference_changed(sender, **kwargs):
+    """Сразу — для текущего процесса, после коммита — чтобы другие не закэшировали старый список."""
+    invalidate_reference(sender)
+    transaction.on_commit(lambda: invalidate_reference(sender))
+
+
+def user_key(user_id) -> str:
+    return f'user:{user_id}'
+
+
+def cached_user(user_id):
+    """
+    Пользователь сессии вместе с профилем — из общего кэша, без запроса к базе на каждый запрос.
+
+    Сбрасывается при сохранении пользователя или профиля; USER_CACHE_TIMEOUT=0 отключает кэш.
+    """
+    if not settings.USER_CACHE_TIMEOUT:
+        return User.objects.select_related('userprofile').filter(pk=user_id).first()
+    key = user_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        # Заполнение кэша — из основной базы: с отстающей реплики в кэш на USER_CACHE_TIMEOUT
+        # попал бы, например, уже заблокированный пользователь.
+        user = User.objects.using(DEFAULT_DB_ALIAS).select_related('userprofile').filter(pk=user_id).first()
+        if user is not None:
+            cache.add(key, user, timeout=settings.USER_CACHE_TIMEOUT)
+    return user
+
+
+def invalidate_user(user_id) -> None:
+    """Сразу и после коммита — чтобы параллельный запрос не вернул в кэш незакоммиченную версию."""
+    cache.delete(user_key(user_id))
+    transaction.on_commit(lambda: cache.delete(user_key(user_id)))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def drop_recipe_fragments(sender, instance, **kwargs):
+    """До сохранения в `updated_at` ещё старая версия — её фрагменты и сбрасываем."""
+    if instance.pk and instance.updated_at:
+        invalidate_recipe(instance.pk, instance.updated_at)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeCategory)
+@receiver(post_delete, sender=RecipeCategory)
+def recipe_part_changed(sender, instance, origin=None, **kwargs):
+    """При пакетной записи версию уже сдвинуло сохранение самого рецепта."""
+    if isinstance(origin, Recipe) or bulk_write_in_progress():
+        return
+    touch_recipe(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.categories.through)
+def recipe_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """`categories.set()` из формы пишет связи пачкой, без post_save на RecipeCategory."""
+    if not action.startswith('post_') or bulk_write_in_progress():
+        return
+    if reverse:
+        for recipe_id in pk_set or ():
+            touch_recipe(recipe_id)
+    else:
+        touch_recipe(instance.pk)
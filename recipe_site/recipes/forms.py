@@ -1,9 +1,39 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from django.forms import inlineformset_factory
+from django.forms import BaseInlineFormSet, inlineformset_factory
+from django.urls import reverse_lazy
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
 
-from .models import Recipe, RecipeIngredient, UserProfile
+from .cache import reference_objects
+from .models import (Category, Ingredient, Recipe, RecipeIngredient,
+                     RecipeSummary, UserProfile)
+
+
+class ReferenceMultipleChoiceField(forms.MultipleChoiceField):
+    """
+    Множественный выбор из справочника, закэшированного в памяти процесса (reference_objects).
+
+    Варианты для рендеринга и проверка выбора не делают запросов; cleaned_data — список объектов.
+    """
+
+    def __init__(self, model, **kwargs):
+        self.model = model
+        super().__init__(choices=self.reference_choices, **kwargs)
+
+    def reference_choices(self):
+        return [(obj.pk, str(obj)) for obj in reference_objects(self.model)]
+
+    def prepare_value(self, value):
+        return [getattr(item, 'pk', item) for item in value or ()]
+
+    def has_changed(self, initial, data):
+        return super().has_changed(self.prepare_value(initial), data)
+
+    def clean(self, value):
+        selected = set(super().clean(value))
+        return [obj for obj in reference_objects(self.model) if str(obj.pk) in selected]
 
 
 class UserProfileForm(forms.ModelForm):
@@ -17,19 +47,17 @@ class UserProfileForm(forms.ModelForm):
 
 
 class RecipeForm(forms.ModelForm):
+    categories = ReferenceMultipleChoiceField(Category, label='Категории', widget=forms.CheckboxSelectMultiple())
+
     class Meta:
         model = Recipe
         fields = ['title', 'description', 'steps', 'cook_time', 'image', 'categories']
-        widgets = {
-            'categories': forms.CheckboxSelectMultiple(),
-        }
         labels = {
             'title': 'Название',
             'description': 'Описание',
             'steps': 'Шаги приготовления',
             'cook_time': 'Время приготовления (мин)',
             'image': 'Изображение',
-            'categories': 'Категории',
         }
 
     def __init__(self, *args, **kwargs):
@@ -62,21 +90,198 @@ class RegisterForm(UserCreationForm):
         return email
 
 
+class BrowseForm(forms.Form):
+    """Фильтры каталога: несколько категорий и диапазонов времени приготовления."""
+    categories = ReferenceMultipleChoiceField(Category, label='Категории', required=False)
+    cook_time = forms.TypedMultipleChoiceField(choices=RecipeSummary.COOK_TIME_BUCKETS, coerce=int, required=False,
+                                               label='Время приготовления')
+
+
+class PrefetchedModelChoiceField(forms.ModelChoiceField):
+    """Выбор объекта, который сначала ищется среди заранее загруженных (`prefetched`: pk -> объект)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prefetched = {}
+
+    def to_python(self, value):
+        try:
+            return self.prefetched[int(value)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_python(value)
+
+
+class IngredientAutocomplete(forms.Widget):
+    """
+    Поле с подсказками вместо <select> со всеми ингредиентами каталога.
+
+    Название вводится в видимое поле `<name>-label` (подсказки — из ingredient_autocomplete),
+    на сервер уходит только id выбранного ингредиента в скрытом поле.
+    """
+    url = reverse_lazy('recipes:ingredient_autocomplete')
+
+    def __init__(self, attrs=None):
+        super().__init__(attrs)
+        self.label = ''
+
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = self.build_attrs(self.attrs, attrs)
+        return format_html(
+            '<input type="hidden" name="{name}" value="{value}" class="ingredient-id">'
+            '<input type="text" name="{name}-label" value="{label}" id="{id}" list="{id}-options" '
+            'class="form-control ingredient-autocomplete" data-url="{url}" autocomplete="off" '
+            'placeholder="Начните вводить название">'
+            '<datalist id="{id}-options"></datalist>',
+            name=name, value='' if value is None else value, label=self.label, id=attrs.get('id', name),
+            url=self.url,
+        )
+
+
+class IngredientListAutocomplete(forms.Widget):
+    """
+    Несколько ингредиентов: выбранные показаны отмеченными флажками с id,
+    новые добавляются через поле с подсказками (см. IngredientAutocomplete).
+    """
+    url = reverse_lazy('recipes:ingredient_autocomplete')
+
+    def __init__(self, attrs=None):
+        super().__init__(attrs)
+        self.names = {}  # id (строкой) -> название, заполняет IngredientListField
+
+    def value_from_datadict(self, data, files, name):
+        return data.getlist(name) if hasattr(data, 'getlist') else data.get(name)
+
+    def value_omitted_from_data(self, data, files, name):
+        return False  # ни одного отмеченного флажка — тоже ответ
+
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = self.build_attrs(self.attrs, attrs)
+        chosen = format_html_join(
+            '', '<label class="form-check"><input type="checkbox" class="form-check-input" name="{}" value="{}" '
+                'checked> {}</label>',
+            ((name, pk, self.names.get(str(pk), pk)) for pk in value or ()),
+        )
+        return format_html(
+            '<div class="ingredient-list" data-name="{name}">{chosen}</div>'
+            '<input type="text" id="{id}" list="{id}-options" class="form-control ingredient-autocomplete" '
+            'data-url="{url}" data-multiple="1" autocomplete="off" placeholder="Начните вводить название">'
+            '<datalist id="{id}-options"></datalist>',
+            name=name, chosen=chosen, id=attrs.get('id', name), url=self.url,
+        )
+
+
+class IngredientListField(forms.Field):
+    """
+    Список ингредиентов по id. Загружаются только отправленные — одним запросом,
+    без выборки всего каталога; cleaned_data — объекты в порядке отправки.
+    """
+    widget = IngredientListAutocomplete
+    default_error_messages = {
+        'invalid': 'Выберите ингредиенты из подсказок.',
+        'invalid_choice': 'Ингредиента %(value)s нет в каталоге.',
+    }
+
+    def to_python(self, value):
+        values = value if isinstance(value, (list, tuple)) else [value] if value else []
+        if not all(str(item).isdigit() for item in values):
+            raise forms.ValidationError(self.error_messages['invalid'], code='invalid')
+        return list(dict.fromkeys(int(item) for item in values))
+
+    def clean(self, value):
+        ids = super().clean(value)
+        found = Ingredient.objects.in_bulk(ids)
+        # Названия для повторного показа формы — из этого же запроса.
+        self.widget.names = {str(pk): ingredient.name for pk, ingredient in found.items()}
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice',
+                                        params={'value': missing[0]})
+        return [found[pk] for pk in ids]
+
+
 class RecipeIngredientForm(forms.ModelForm):
     class Meta:
         model = RecipeIngredient
         fields = ['ingredient', 'amount', 'unit']
+        field_classes = {
+            'ingredient': PrefetchedModelChoiceField,
+        }
+        widgets = {
+            'ingredient': IngredientAutocomplete(),
+        }
         labels = {
             'ingredient': 'Ингредиент',
             'amount': 'Количество',
             'unit': 'Единица',
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        widget = self.fields['ingredient'].widget
+        if self.is_bound:
+            widget.label = self.data.get(f'{self.add_prefix("ingredient")}-label', '')
+        elif self.instance.ingredient_id:
+            widget.label = self.instance.ingredient.name
+
+    def _get_validation_exclusions(self):
+        """Существование ингредиента уже проверило поле формы — без повторного SELECT в full_clean()."""
+        exclude = super()._get_validation_exclusions()
+        exclude.add('ingredient')
+        return exclude
+
+
+class IngredientMatchForm(forms.Form):
+    """Подбор рецептов по ингредиентам, которые есть под рукой."""
+    ingredients = IngredientListField(label="Что есть под рукой")
+    max_missing = forms.IntegerField(label="Можно докупить", min_value=0, max_value=10, initial=2,
+                                     required=False,
+                                     widget=forms.NumberInput(attrs={'class': 'form-control'}))
+
+
+class BaseRecipeIngredientFormSet(BaseInlineFormSet):
+    def __init__(self, *args, queryset=None, **kwargs):
+        """Названия ингредиентов для полей автодополнения — тем же запросом, что и строки."""
+        if queryset is None:
+            queryset = RecipeIngredient.objects.select_related('ingredient')
+        super().__init__(*args, queryset=queryset, **kwargs)
+
+    @cached_property
+    def posted_ingredients(self) -> dict:
+        """Все ингредиенты из отправленных строк одним запросом — общий для форм формсета."""
+        if not self.is_bound:
+            return {}
+        ids = set()
+        for i in range(self.total_form_count()):
+            value = str(self.data.get(f'{self.add_prefix(i)}-ingredient', ''))
+            if value.isdigit():
+                ids.add(int(value))
+        return Ingredient.objects.in_bulk(ids)
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        form.fields['ingredient'].prefetched = self.posted_ingredients
+        return form
+
+    def add_fields(self, form, index):
+        """Поле id ищет строку среди уже загруженных строк формсета, а не запросом на каждую форму."""
+        super().add_fields(form, index)
+        field = form.fields[self._pk_field.name]
+        form.fields[self._pk_field.name] = pk_field = PrefetchedModelChoiceField(
+            field.queryset, initial=field.initial, required=False, widget=field.widget,
+        )
+        if index is not None and index < self.initial_form_count():
+            pk_field.prefetched = self.existing_rows
+
+    @cached_property
+    def existing_rows(self) -> dict:
+        return {item.pk: item for item in self.get_queryset()}
+
 
 RecipeIngredientFormSet = inlineformset_factory(
     Recipe,
     RecipeIngredient,
     form=RecipeIngredientForm,
+    formset=BaseRecipeIngredientFormSet,
     extra=1,
     can_delete=True
 )
@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+PURGE_HEADER = 'X-Cache-Refresh'
+PURGE_TIMEOUT = 5
+
+_executor = None
+
+
+def viewer_key(request) -> str:
+    """
+    Часть ETag, зависящая от зрителя: шапка показывает пользователя и его аватар,
+    а форма выхода — CSRF-токен сессии. Профиль всё равно читается для шапки.
+    """
+    if not request.user.is_authenticated:
+        return 'anonymous'
+    try:
+        profile_version = request.user.userprofile.updated_at.timestamp()
+    except ObjectDoesNotExist:
+        profile_version = None
+    return f'{request.session.session_key}:{profile_version}'
+
+
+def page_etag(parts, request) -> str:
+    raw = '|'.join(str(part) for part in (*parts, viewer_key(request)))
+    return quote_etag(hashlib.sha256(raw.encode()).hexdigest()[:32])
+
+
+def cache_headers(request, response, etag: str, last_modified: float):
+    """Валидаторы и Cache-Control: анонимам — публичный кэш, остальным — только браузер с перепроверкой."""
+    if response.status_code not in (200, 304):
+        return response
+    response.headers.setdefault('ETag', etag)
+    response.headers.setdefault('Last-Modified', http_date(last_modified))
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.ANONYMOUS_CACHE_MAX_AGE)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def conditional_page(version):
+    """
+    Условный GET в духе condition(): ETag и Last-Modified по версии страницы, 304 без рендеринга.
+
+    `version(request, *args, **kwargs)` возвращает (updated_at, части ETag) или None —
+    тогда представление отрабатывает как обычно (например, отдаёт 404).
+    Работает и с синхронными, и с асинхронными представлениями.
+    """
+    def decorator(view):
+        def validators(request, *args, **kwargs):
+            page = version(request, *args, **kwargs)
+            if page is None:
+                return None
+            updated_at, parts = page
+            return page_etag(parts, request), int(updated_at.timestamp())
+
+        def respond(request, page, response):
+            return cache_headers(request, response, *page)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                page = None
+                if request.method in ('GET', 'HEAD'):
+                    page = await sync_to_async(validators)(request, *args, **kwargs)
+                if page is None:
+                    return await view(request, *args, **kwargs)
+                response = get_conditional_response(request, etag=page[0], last_modified=page[1])
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return await sync_to_async(respond)(request, page, response)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            page = validators(request, *args, **kwargs) if request.method in ('GET', 'HEAD') else None
+            if page is None:
+                return view(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=page[0], last_modified=page[1])
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return respond(request, page, response)
+        return wrapper
+    return decorator
+
+
+def executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-purge')
+    return _executor
+
+
+def refresh_cached_pages(paths: list[str]) -> None:
+    """
+    Просит nginx перечитать страницы в proxy_cache: запрос с X-Cache-Refresh идёт мимо кэша,
+    и свежий ответ (или 404 удалённого рецепта) заменяет сохранённый.
+    """
+    for path in paths:
+        request = urllib.request.Request(settings.CACHE_PURGE_URL.rstrip('/') + path, headers={
+            'Host': settings.ALLOWED_HOSTS[0], PURGE_HEADER: '1',
+        })
+        try:
+            urllib.request.urlopen(request, timeout=PURGE_TIMEOUT).close()
+        except urllib.error.HTTPError:
+            pass  # 404 удалённого рецепта — тоже свежий ответ
+        except OSError:
+            logger.warning('Не удалось обновить кэш nginx для %s', path, exc_info=True)
+
+
+def purge_recipe_pages(recipe_id: int, author_id: int) -> None:
+    """После коммита обновляет в кэше nginx страницу рецепта и первую страницу профиля автора."""
+    if not settings.CACHE_PURGE_URL:
+        return
+
+    def submit():
+        username = User.objects.filter(pk=author_id).values_list('username', flat=True).first()
+        paths = [reverse('recipes:recipe_detail', args=[recipe_id])]
+        if username:
+            paths.append(reverse('recipes:user_profile', args=[username]))
+        executor().submit(refresh_cached_pages, paths)
+
+    transaction.on_commit(submit)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    purge_recipe_pages(instance.pk, instance.author_id)
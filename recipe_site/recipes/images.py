@@ -0,0 +1,154 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import invalidate_user
+from .models import Recipe, UserProfile
+from .summary import refresh_summaries
+
+logger = logging.getLogger(__name__)
+
+# Поле изображения -> ширины вариантов (аватар показывается квадратом 40 и 100 px).
+VARIANT_WIDTHS = {
+    (Recipe, 'image'): (320, 640, 1280),
+    (UserProfile, 'avatar'): (80, 200),
+}
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+QUALITY = 80
+
+_executor = None
+
+
+def executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix='images')
+    return _executor
+
+
+def variant_name(source: str, width: int, extension: str) -> str:
+    path = PurePosixPath(source)
+    return str(PurePosixPath('variants') / path.parent / f'{path.stem}-{width}.{extension}')
+
+
+def render_variant(image: Image.Image, width: int, image_format: str) -> tuple[ContentFile, int]:
+    """
+    Уменьшает копию не больше чем до `width` по ширине; EXIF и прочие метаданные не переносятся.
+    Возвращает файл и его настоящую ширину — узкое изображение не растягивается.
+    """
+    variant = image.copy()
+    variant.thumbnail((width, width * 10), Image.LANCZOS)
+    buffer = BytesIO()
+    variant.save(buffer, image_format, quality=QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue()), variant.width
+
+
+def generate_variants(model, pk: int, field_name: str) -> None:
+    """
+    Строит варианты изображения и сохраняет их список в `<поле>_variants`;
+    если изображение убрали — удаляет оставшиеся от него варианты.
+    """
+    try:
+        instance = model.objects.filter(pk=pk).first()
+        if instance is None:
+            return
+        field = getattr(instance, field_name)
+        if not field:
+            if getattr(instance, f'{field_name}_variants'):
+                save_variants(instance, field_name, {})
+            return
+        source = field.name
+        with field.open('rb') as file, Image.open(file) as original:
+            image = ImageOps.exif_transpose(original).convert('RGB')
+        variants = {'source': source}
+        for extension, image_format in FORMATS.items():
+            variants[extension] = {}
+            for width in VARIANT_WIDTHS[(model, field_name)]:
+                if width > image.width and variants[extension]:
+                    break
+                content, real_width = render_variant(image, width, image_format)
+                if str(real_width) in variants[extension]:
+                    break  # очень высокое изображение упёрлось в предел по высоте
+                # В имени и ключе — настоящая ширина: по ней браузер выбирает вариант из srcset.
+                name = variant_name(source, real_width, extension)
+                default_storage.delete(name)
+                variants[extension][str(real_width)] = default_storage.save(name, content)
+        save_variants(instance, field_name, variants)
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s #%s', model.__name__, pk)
+    finally:
+        if settings.IMAGE_WORKERS:
+            connection.close()
+
+
+def save_variants(instance, field_name: str, variants: dict) -> None:
+    """
+    Записывает новый список вариантов, если изображение за это время не сменилось,
+    и удаляет файлы прежних вариантов. Пустой список — изображение убрано.
+    """
+    model = type(instance)
+    stale = getattr(instance, f'{field_name}_variants')
+    updates = {f'{field_name}_variants': variants}
+    if any(model_field.name == 'updated_at' for model_field in model._meta.fields):
+        updates['updated_at'] = timezone.now()  # новая версия сбрасывает кэш фрагментов
+    if variants:
+        unchanged = Q(**{field_name: variants['source']})
+    else:
+        unchanged = Q(**{field_name: ''}) | Q(**{f'{field_name}__isnull': True})
+    if not model.objects.filter(unchanged, pk=instance.pk).update(**updates):
+        return
+    delete_variants(stale, keep=variants)
+    if model is Recipe:
+        refresh_summaries([instance.pk])
+    else:
+        invalidate_user(instance.user_id)  # аватар в шапке берётся из кэша пользователя
+
+
+def delete_variants(variants: dict, keep: dict | None = None) -> None:
+    keep_names = {name for extension in FORMATS for name in (keep or {}).get(extension, {}).values()}
+    for extension in FORMATS:
+        for name in variants.get(extension, {}).values():
+            if name not in keep_names:
+                default_storage.delete(name)
+
+
+def schedule_variants(model, pk: int, field_name: str) -> None:
+    """После коммита отдаёт обработку в пул потоков (IMAGE_WORKERS=0 — синхронно)."""
+    if settings.IMAGE_WORKERS:
+        transaction.on_commit(lambda: executor().submit(generate_variants, model, pk, field_name))
+    else:
+        transaction.on_commit(lambda: generate_variants(model, pk, field_name))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=UserProfile)
+def image_uploaded(sender, instance, **kwargs):
+    """Запускает обработку, если загружено новое изображение или убрано старое."""
+    for (model, field_name) in VARIANT_WIDTHS:
+        if model is not sender:
+            continue
+        field = getattr(instance, field_name)
+        variants = getattr(instance, f'{field_name}_variants')
+        if (field.name or None) != variants.get('source'):
+            schedule_variants(sender, instance.pk, field_name)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=UserProfile)
+def image_owner_deleted(sender, instance, **kwargs):
+    """Варианты удаляются вместе с рецептом или профилем; исходный файл Django, как обычно, не трогает."""
+    for (model, field_name) in VARIANT_WIDTHS:
+        variants = getattr(instance, f'{field_name}_variants') if model is sender else None
+        if variants:
+            transaction.on_commit(lambda variants=variants: delete_variants(variants))
@@ -0,0 +1,206 @@
+import json
+import random
+import statistics
+import time
+import tracemalloc
+
+import orjson
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from recipes.api import FIELDS, api_queryset, export_lines, serialize
+from recipes.benchmarks import (VIEW_BUDGETS, create_categories,
+                                create_ingredients, create_recipes,
+                                create_users, percentile)
+from recipes.models import Recipe
+from recipes.search import (browse_facets, browse_recipes,
+                            recipes_by_ingredients, search_recipes)
+from recipes.services import random_recipes
+
+SEARCH_QUERIES = ["борщ", "курица с грибами", "пирог яблоки", "творожная запеканка"]
+INGREDIENT_POOL = 2_000
+# Популярные ингредиенты сценария cook: каждый — в половине рецептов (benchmarks.STAPLE_SHARE).
+COOK_STAPLES = 3
+GIN_CLEAN_PENDING_LISTS = """
+    SELECT gin_clean_pending_list(index.oid) FROM pg_class AS index
+    JOIN pg_am ON pg_am.oid = index.relam
+    WHERE pg_am.amname = 'gin' AND index.relnamespace = current_schema()::regnamespace
+"""
+
+
+class Rollback(Exception):
+    """Откатывает тестовые данные после замеров."""
+
+
+class Command(BaseCommand):
+    help = ("Замеряет задержку выборок и представлений на разных объёмах каталога (данные откатываются). "
+            "Сценарий views завершается ошибкой, если превышен бюджет из recipes.benchmarks.VIEW_BUDGETS")
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=['home', 'search', 'cook', 'browse', 'views', 'sessions', 'api'])
+        parser.add_argument('--sizes', nargs='+', type=int)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        scenario = options['scenario']
+        sizes = options['sizes'] or {
+            'home': [1_000, 10_000, 100_000, 1_000_000],
+            'search': [100_000],
+            'cook': [500_000],
+            'browse': [10_000, 100_000, 500_000],
+            'views': [1_000, 10_000, 100_000],
+            'sessions': [10_000],
+            'api': [10_000, 100_000],
+        }[scenario]
+        self.failures = []
+        try:
+            with transaction.atomic():
+                self.authors = create_users(max(10, max(sizes) // 100), prefix='benchmark')
+                self.ingredients = create_ingredients(INGREDIENT_POOL, prefix='benchmark')
+                self.categories = create_categories(prefix='benchmark')
+                total = 0
+                for size in sorted(sizes):
+                    create_recipes(size - total, self.authors, self.ingredients, self.categories,
+                                   batch_size=options['batch_size'], seed=total,
+                                   staples=COOK_STAPLES if scenario == 'cook' else 0)
+                    total = size
+                    if connection.vendor == 'postgresql':
+                        with connection.cursor() as cursor:
+                            cursor.execute('ANALYZE')  # планировщику — статистика по только что созданным строкам
+                            # Новые записи GIN-индексов копятся в списке ожидания, который каждый
+                            # запрос читает целиком; на живой базе его разбирает автоочистка.
+                            cursor.execute(GIN_CLEAN_PENDING_LISTS)
+                    getattr(self, f'bench_{scenario}')(size, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+        if self.failures:
+            raise CommandError('Превышены бюджеты:\n' + '\n'.join(self.failures))
+
+    def timed(self, label, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(f'{label}: медиана {statistics.median(timings):.2f} мс, '
+                          f'p95 {percentile(timings, 0.95):.2f} мс, p99 {percentile(timings, 0.99):.2f} мс')
+        return timings
+
+    def bench_home(self, size, repeat):
+        self.timed(f'{size:>9} рецептов, случайные', lambda: random_recipes(5), repeat)
+
+    def bench_search(self, size, repeat):
+        for query in SEARCH_QUERIES:
+            word = query.split()[0]
+            self.timed(f'{size:>9} рецептов, «{query}», полнотекстовый',
+                       lambda: list(search_recipes(query)), repeat)
+            self.timed(f'{size:>9} рецептов, «{word}», icontains',
+                       lambda: list(Recipe.objects.filter(Q(title__icontains=word) | Q(description__icontains=word))
+                                    .order_by('-created_at')[:50]), repeat)
+
+    def bench_cook(self, size, repeat):
+        rng = random.Random(size)
+        staples = [ingredient.pk for ingredient in self.ingredients[:COOK_STAPLES]]
+        pool = [ingredient.pk for ingredient in self.ingredients[COOK_STAPLES:]]
+        self.timed(f'{size:>9} рецептов, 10 ингредиентов, не хватает ≤ 2',
+                   lambda: list(recipes_by_ingredients(rng.sample(pool, 10), max_missing=2)), repeat)
+        self.timed(f'{size:>9} рецептов, {COOK_STAPLES} популярных + {10 - COOK_STAPLES}, не хватает ≤ 2',
+                   lambda: list(recipes_by_ingredients(staples + rng.sample(pool, 10 - COOK_STAPLES),
+                                                       max_missing=2)), repeat)
+
+    def bench_browse(self, size, repeat):
+        categories = [category.pk for category in self.categories]
+        for label, category_ids, buckets in [('без фильтров', [], []), ('2 категории', categories[:2], []),
+                                             ('до 30 минут', [], [15, 30]),
+                                             ('2 категории, до 30 минут', categories[:2], [15, 30])]:
+            self.timed(f'{size:>9} рецептов, {label}, фасеты',
+                       lambda: browse_facets(category_ids, buckets), repeat)
+            self.timed(f'{size:>9} рецептов, {label}, страница',
+                       lambda: browse_recipes(category_ids, buckets), repeat)
+
+    def bench_views(self, size, repeat):
+        """Страницы через тестовый клиент: перцентили задержки и число SQL-запросов против бюджетов."""
+        author_id = (Recipe.objects.values('author').annotate(total=Count('id'))
+                     .order_by('-total').values_list('author', flat=True).first())
+        author = next(user for user in self.authors if user.pk == author_id)
+        recipe = Recipe.objects.filter(author=author).order_by('-id').first()
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        client.force_login(author)
+        anonymous = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        pages = {
+            'home': (anonymous, reverse('recipes:home')),
+            'recipe_detail': (anonymous, reverse('recipes:recipe_detail', args=[recipe.pk])),
+            'profile': (client, reverse('recipes:profile')),
+            'user_profile': (anonymous, reverse('recipes:user_profile', args=[author.username])),
+            'add_recipe': (client, reverse('recipes:add_recipe')),
+            'edit_recipe': (client, reverse('recipes:edit_recipe', args=[recipe.pk])),
+        }
+        for name, (page_client, url) in pages.items():
+            with CaptureQueriesContext(connection) as ctx:
+                response = page_client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{url} вернул {response.status_code}')
+            timings = self.timed(f'{size:>9} рецептов, {name}, {len(ctx)} SQL, {len(response.content) / 1024:.0f} КБ',
+                                 lambda: page_client.get(url), repeat)
+            budget = VIEW_BUDGETS[name]
+            if len(ctx) > budget['queries']:
+                self.failures.append(f'{size} рецептов, {name}: {len(ctx)} SQL > {budget["queries"]}')
+            if percentile(timings, 0.95) > budget['p95_ms']:
+                self.failures.append(
+                    f'{size} рецептов, {name}: p95 {percentile(timings, 0.95):.1f} мс > {budget["p95_ms"]} мс'
+                )
+
+    def bench_sessions(self, size, repeat):
+        """Авторизованный profile_view: сессии в базе или в кэше, пользователь из базы или из кэша."""
+        author = self.authors[0]
+        url = reverse('recipes:profile')
+        for label, engine, user_cache_timeout in [
+            ('сессия в БД, пользователь из БД', 'django.contrib.sessions.backends.db', 0),
+            ('cached_db, пользователь из БД', 'django.contrib.sessions.backends.cached_db', 0),
+            ('cached_db, пользователь из кэша', 'django.contrib.sessions.backends.cached_db', 300),
+        ]:
+            with override_settings(SESSION_ENGINE=engine, USER_CACHE_TIMEOUT=user_cache_timeout):
+                client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+                client.force_login(author)
+                client.get(url)
+                with CaptureQueriesContext(connection) as ctx:
+                    response = client.get(url)
+                if response.status_code != 200:
+                    raise CommandError(f'{url} вернул {response.status_code}')
+                timings = self.timed(f'{size:>9} рецептов, profile, {label}, {len(ctx)} SQL',
+                                     lambda: client.get(url), repeat)
+                self.stdout.write(f'{"":>9} {1000 * len(timings) / sum(timings):.0f} запросов/с в один поток')
+
+    def bench_api(self, size, repeat):
+        """JSON API: json против orjson на странице из 100 рецептов и потоковая выгрузка всего каталога."""
+        fields = list(FIELDS)
+        data = [serialize(recipe, fields) for recipe in api_queryset(fields).order_by('-pk')[:100]]
+        for label, dump in [
+            ('json.dumps', lambda: json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False).encode()),
+            ('orjson.dumps', lambda: orjson.dumps(data)),
+        ]:
+            timings = self.timed(f'{size:>9} рецептов, 100 в ответе, {label}', dump, repeat)
+            self.stdout.write(f'{"":>9} {100_000 * len(timings) / sum(timings):.0f} рецептов/с')
+        self.timed(f'{size:>9} рецептов, 100 в ответе, выборка и serialize()',
+                   lambda: [serialize(recipe, fields) for recipe in api_queryset(fields).order_by('-pk')[:100]],
+                   max(1, repeat // 10))
+
+        started = time.perf_counter()
+        exported = sum(len(chunk) for chunk in export_lines(fields))
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        for _ in export_lines(fields):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.stdout.write(f'{size:>9} рецептов, выгрузка: {elapsed:.1f} с, {size / elapsed:.0f} рецептов/с, '
+                          f'{exported / 2**20:.1f} МБ, пик памяти Python {peak / 2**20:.1f} МБ')
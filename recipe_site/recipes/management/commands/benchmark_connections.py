@@ -0,0 +1,99 @@
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import RequestFactory
+from django.test.client import FakePayload
+from django.urls import reverse
+
+from recipes.benchmarks import percentile
+from recipes.models import Recipe
+
+MODES = ['fresh', 'persistent', 'pool']
+
+
+class Command(BaseCommand):
+    help = ("Запросы/с страницы рецепта через WSGI-обработчик в потоках-«воркерах»: новое соединение на "
+            "каждый запрос (fresh), постоянные соединения (persistent) и пул psycopg 3 (pool). "
+            "Нужны данные в базе, например из generate_data")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=2_000)
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.order_by('-id').values_list('id', flat=True)[:100])
+        if not recipe_ids:
+            raise CommandError('В базе нет рецептов — сначала manage.py generate_data')
+        factory = RequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        environs = [factory.get(reverse('recipes:recipe_detail', args=[pk])).environ for pk in recipe_ids]
+        connection.close()
+
+        original = connections.settings[connection.alias].copy()
+        try:
+            for mode in options['modes']:
+                if mode == 'pool' and connection.vendor != 'postgresql':
+                    self.stdout.write(f'{mode}: пропущен — пул есть только у PostgreSQL')
+                    continue
+                self.configure(mode, original)
+                try:
+                    self.run(mode, environs, options['threads'], options['requests'])
+                finally:
+                    if mode == 'pool':
+                        connection.close_pool()
+        finally:
+            connections.settings[connection.alias].update(original)
+
+    @staticmethod
+    def configure(mode, original):
+        # Потоки создают свои обёртки соединений из этого же словаря настроек.
+        options = {key: value for key, value in original['OPTIONS'].items() if key != 'pool'}
+        if mode == 'pool':
+            options['pool'] = original['OPTIONS'].get('pool') or True
+        connections.settings[connection.alias].update({
+            'CONN_MAX_AGE': 60 if mode == 'persistent' else 0,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': options,
+        })
+
+    def run(self, mode, environs, threads, requests):
+        handler = WSGIHandler()
+        numbers = iter(range(requests))
+        results = []
+
+        def worker():
+            # Как синхронный воркер gunicorn: request_started/finished закрывают или оставляют
+            # соединение потока по CONN_MAX_AGE, а с пулом возвращают его в пул.
+            for number in numbers:
+                environ = {**environs[number % len(environs)], 'wsgi.input': FakePayload(b'')}
+                started = time.perf_counter()
+                response = handler(environ, lambda status, headers: None)
+                try:
+                    b''.join(response)
+                finally:
+                    response.close()
+                results.append((response.status_code == 200, (time.perf_counter() - started) * 1000))
+            connections.close_all()
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        timings = sorted(duration for ok, duration in results if ok)
+        errors = sum(1 for ok, _ in results if not ok)
+        if not timings:
+            raise CommandError(f'{mode}: все {errors} запросов завершились ошибкой')
+        self.stdout.write(
+            f'{mode:>10}, {threads} потоков: {len(results) / elapsed:8.1f} запросов/с, '
+            f'медиана {statistics.median(timings):.1f} мс, p95 {percentile(timings, 0.95):.1f} мс, '
+            f'ошибок {errors}'
+        )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.benchmarks import (PASSWORD, create_categories,
+                                create_ingredients, create_recipes,
+                                create_users)
+
+
+class Command(BaseCommand):
+    help = "Заполняет базу синтетическими пользователями, ингредиентами, категориями и рецептами (для нагрузочных тестов)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=10_000)
+        parser.add_argument('--ingredients', type=int, default=2_000)
+        parser.add_argument('--per-recipe', type=int, default=8)
+        parser.add_argument('--prefix', default='load')
+        parser.add_argument('--batch-size', type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        with transaction.atomic():
+            users = create_users(options['users'], prefix=prefix)
+            ingredients = create_ingredients(options['ingredients'], prefix=prefix)
+            categories = create_categories(prefix=prefix)
+            create_recipes(options['recipes'], users, ingredients, categories,
+                           per_recipe=options['per_recipe'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Создано: {options['users']} пользователей ({prefix}_0… пароль {PASSWORD}), "
+            f"{options['ingredients']} ингредиентов, {len(categories)} категорий, {options['recipes']} рецептов."
+        ))
@@ -1,11 +1,85 @@
-from django.core.management.base import BaseCommand
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
 from recipes.models import Ingredient
 
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+
 
 class Command(BaseCommand):
-    help = "Загружает 150 популярных ингредиентов в базу данных"
+    help = ("Загружает ингредиенты в базу данных: 150 популярных "
+            "или каталог из файла CSV / JSON Lines (пачками, без дублей)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?',
+                            help='CSV (название в первой колонке) или JSON Lines ({"name": ...} в строке)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Формат файла; по умолчанию определяется по расширению')
+        parser.add_argument('--batch-size', type=int, default=5_000)
 
-    def handle(self, *args, **kwargs):
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        names = self.read_file(options['path'], options['format']) if options['path'] else self.popular()
+
+        before = Ingredient.objects.count()
+        processed = 0
+        while chunk := list(islice(names, options['batch_size'])):
+            with transaction.atomic():
+                Ingredient.objects.bulk_create(
+                    [Ingredient(name=name) for name in dict.fromkeys(chunk)],
+                    ignore_conflicts=True,
+                )
+            processed += len(chunk)
+            self.stdout.write(f'Обработано строк: {processed}')
+
+        created_count = Ingredient.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(f'✅ Загружено {created_count} ингредиентов (без дублей).'))
+
+    def read_file(self, path, file_format):
+        """Построчно отдаёт названия из файла, не читая его в память целиком; плохие строки пропускает."""
+        path = Path(path)
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден')
+        file_format = file_format or ('jsonl' if path.suffix in ('.jsonl', '.ndjson') else 'csv')
+        # utf-8-sig: Excel и многие выгрузки начинают файл с BOM, иначе он попал бы в первое название.
+        with path.open(encoding='utf-8-sig', newline='') as file:
+            if file_format == 'csv':
+                rows = (row[0] if row else '' for row in csv.reader(file))
+            else:
+                rows = (self.jsonl_name(line) for line in file)
+            for number, name in enumerate(rows, start=1):
+                if name is None:
+                    self.stderr.write(f'Строка {number}: нет названия-строки ({{"name": "..."}}), пропущено')
+                    continue
+                name = name.strip()
+                if not name or (number == 1 and name.lower() in ('name', 'название')):
+                    continue
+                if len(name) > NAME_MAX_LENGTH:
+                    self.stderr.write(f'Строка {number}: название длиннее {NAME_MAX_LENGTH} символов, пропущено')
+                    continue
+                yield name
+
+    @staticmethod
+    def jsonl_name(line):
+        """Название из строки JSON Lines: объект с полем name или просто строка; None — строка некорректна."""
+        if not line.strip():
+            return ''
+        try:
+            item = json.loads(line)
+        except ValueError:
+            return None
+        if isinstance(item, dict):
+            item = item.get('name')
+        return item if isinstance(item, str) else None
+
+    @staticmethod
+    def popular():
         ingredients = [
             "Картофель", "Морковь", "Лук", "Чеснок", "Свёкла", "Капуста", "Брокколи", "Цветная капуста", "Кабачок",
             "Баклажан", "Томат", "Огурец", "Перец болгарский", "Шпинат", "Салат", "Петрушка", "Укроп", "Кинза",
@@ -25,11 +99,4 @@ class Command(BaseCommand):
             "Тыквенные семечки", "Чиа", "Льняное семя", "Изюм", "Курага", "Финики", "Чернослив", "Хлеб", "Булочка",
             "Багет", "Пита", "Лаваш", "Тортилья", "Крахмал", "Желатин", "Агар-агар", "Уксус", "Лимон", "Лайм"
         ]
-
-        created_count = 0
-        for name in ingredients:
-            obj, created = Ingredient.objects.get_or_create(name=name)
-            if created:
-                created_count += 1
-
-        self.stdout.write(self.style.SUCCESS(f'✅ Загружено {created_count} ингредиентов (без дублей).'))
+        return iter(ingredients)
@@ -0,0 +1,48 @@
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.benchmarks import percentile
+
+
+class Command(BaseCommand):
+    help = ("Нагружает запущенный сервер параллельными соединениями и выводит запросы/с и перцентили. "
+            "Например, сравнить SERVER_MODE=wsgi и SERVER_MODE=asgi на одних и тех же страницах")
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='Адреса страниц, запрашиваются по кругу')
+        parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 10, 50, 100])
+        parser.add_argument('--requests', type=int, default=1_000)
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        for concurrency in options['concurrency']:
+            urls = list(islice(cycle(options['urls']), options['requests']))
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(lambda url: self.fetch(url, options['timeout']), urls))
+            elapsed = time.perf_counter() - started
+
+            timings = sorted(duration for ok, duration in results if ok)
+            errors = sum(1 for ok, _ in results if not ok)
+            if not timings:
+                raise CommandError(f'Все {errors} запросов завершились ошибкой')
+            self.stdout.write(
+                f'{concurrency:>4} соединений: {len(results) / elapsed:8.1f} запросов/с, '
+                f'медиана {statistics.median(timings):.1f} мс, p95 {percentile(timings, 0.95):.1f} мс, '
+                f'p99 {percentile(timings, 0.99):.1f} мс, ошибок {errors}'
+            )
+
+    @staticmethod
+    def fetch(url, timeout):
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                response.read()
+            return True, (time.perf_counter() - started) * 1000
+        except OSError:
+            return False, (time.perf_counter() - started) * 1000
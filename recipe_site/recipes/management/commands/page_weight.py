@@ -0,0 +1,125 @@
+import gzip
+import re
+import time
+import urllib.error
+import urllib.request
+from email.utils import parsedate_to_datetime
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from django.core.management.base import BaseCommand, CommandError
+
+ACCEPT_ENCODING = 'gzip'
+MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+class AssetParser(HTMLParser):
+    """Ресурсы, которые браузер загрузит вместе со страницей: стили, скрипты, картинки."""
+
+    def __init__(self):
+        super().__init__()
+        self.assets = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'link' and 'stylesheet' in (attrs.get('rel') or '').split():
+            self.assets.append(attrs.get('href'))
+        elif tag in ('script', 'img'):
+            self.assets.append(attrs.get('src'))
+
+
+class Command(BaseCommand):
+    help = ("Байты, переданные при холодной и повторной (тёплой) загрузке страниц работающего сайта: "
+            "HTML и его стили, скрипты, картинки. Тёплая загрузка ведёт себя как браузер — свежие по "
+            "Cache-Control ресурсы не запрашивает, остальные перепроверяет по ETag/Last-Modified")
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='Адреса страниц, например http://localhost/recipe/1/')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        self.timeout = options['timeout']
+        for url in options['urls']:
+            cache = {}
+            cold = self.load(url, cache)
+            warm = self.load(url, cache)
+            self.stdout.write(
+                f'{url}: холодная {self.total(cold) / 1024:.1f} КБ за {len(cold)} запросов, '
+                f'тёплая {self.total(warm) / 1024:.1f} КБ за {len(warm)} запросов'
+            )
+            for (asset, cold_bytes, _), warm_entry in zip(cold, self.by_url(warm, cold)):
+                warm_text = 'из кэша' if warm_entry is None else f'{warm_entry[1] / 1024:.1f} КБ ({warm_entry[2]})'
+                self.stdout.write(f'  {cold_bytes / 1024:8.1f} КБ → {warm_text:<20} {asset}')
+
+    @staticmethod
+    def total(entries):
+        return sum(size for _, size, _ in entries)
+
+    @staticmethod
+    def by_url(warm, cold):
+        found = {asset: (asset, size, status) for asset, size, status in warm}
+        return [found.get(asset) for asset, _, _ in cold]
+
+    def load(self, url, cache):
+        """Страница и её ресурсы; `cache` — URL -> (заголовки, время ответа, тело), как кэш браузера."""
+        entries = []
+        body = self.fetch(url, cache, entries, decode=True)
+        if body is None:
+            raise CommandError(f'{url}: страница не из кэша, а ответ пустой')
+        parser = AssetParser()
+        parser.feed(body)
+        for asset in dict.fromkeys(filter(None, parser.assets)):
+            self.fetch(urljoin(url, asset), cache, entries)
+        return entries
+
+    def fetch(self, url, cache, entries, decode=False):
+        cached = cache.get(url)
+        if cached and self.fresh(*cached[:2]):
+            return cached[2]
+        headers = {'Accept-Encoding': ACCEPT_ENCODING}
+        if cached:
+            if etag := cached[0].get('ETag'):
+                headers['If-None-Match'] = etag
+            if last_modified := cached[0].get('Last-Modified'):
+                headers['If-Modified-Since'] = last_modified
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as error:
+            if error.code != 304:
+                raise CommandError(f'{url} вернул {error.code}') from error
+            response = error
+        except OSError as error:
+            if decode:
+                raise CommandError(f'{url} недоступен: {error}') from error
+            self.stderr.write(f'{url} пропущен: {error}')  # например, CDN без доступа в интернет
+            return None
+        with response:
+            raw = response.read()
+            size = len(raw) + len(str(response.headers)) + len(f'HTTP/1.1 {response.status}\r\n')
+            entries.append((url, size, response.status))
+            if response.status == 304:
+                return cached[2]
+            body = self.decode(raw, response.headers.get('Content-Encoding')) if decode else None
+            cache[url] = (response.headers, time.time(), body)
+            return body
+
+    @staticmethod
+    def fresh(headers, received):
+        control = headers.get('Cache-Control', '')
+        if 'no-cache' in control or 'no-store' in control:
+            return False
+        if match := MAX_AGE.search(control):
+            return time.time() - received < int(match.group(1))
+        if expires := headers.get('Expires'):
+            try:
+                return parsedate_to_datetime(expires).timestamp() > time.time()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    @staticmethod
+    def decode(raw, encoding):
+        if encoding == 'gzip':
+            raw = gzip.decompress(raw)
+        return raw.decode('utf-8', errors='replace')
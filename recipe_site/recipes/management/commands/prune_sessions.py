@@ -0,0 +1,20 @@
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = ("Удаляет истёкшие сессии из базы пачками, чтобы не держать долгих блокировок "
+            "(в отличие от clearsessions — одним DELETE). Запускается по расписанию")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        expired = Session.objects.filter(expire_date__lt=timezone.now()).values_list('session_key', flat=True)
+        total = 0
+        while keys := list(expired[:options['batch_size']]):
+            total += Session.objects.filter(session_key__in=keys).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'✅ Удалено истёкших сессий: {total}.'))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.summary import SUMMARY_BATCH_SIZE, rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Перестраивает с нуля сводку рецептов для списков (recipes_recipesummary) пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SUMMARY_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        started = time.perf_counter()
+        total = rebuild_summaries(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Сводка перестроена: {total} рецептов за {time.perf_counter() - started:.1f} с.'
+        ))
@@ -0,0 +1,107 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+from .cache import fragment_cache_stats
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+BYTES_BUCKETS = (1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+
+
+@dataclass
+class RequestTimings:
+    """Замеры одного запроса; заполняются обёрткой SQL и шаблонным бэкендом."""
+    queries: int = 0
+    sql: float = 0.0
+    templates: float = 0.0
+
+
+current_timings: ContextVar[RequestTimings | None] = ContextVar('current_timings', default=None)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}  # view -> [счётчики корзин..., +Inf, сумма]
+
+    def observe(self, view, value):
+        series = self.series.setdefault(view, [0] * (len(self.buckets) + 1) + [0.0])
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for view, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{view="{view}"}} {series[-1]}')
+            lines.append(f'{self.name}_count{{view="{view}"}} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Метрики текущего процесса (у каждого воркера gunicorn — свои)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {
+            'duration': Histogram('recipes_request_duration_seconds', 'Время обработки запроса', SECONDS_BUCKETS),
+            'sql': Histogram('recipes_sql_duration_seconds', 'Время SQL-запросов за запрос', SECONDS_BUCKETS),
+            'queries': Histogram('recipes_sql_queries', 'Число SQL-запросов за запрос', QUERY_BUCKETS),
+            'templates': Histogram('recipes_template_duration_seconds', 'Время рендеринга шаблонов',
+                                   SECONDS_BUCKETS),
+            'size': Histogram('recipes_response_bytes', 'Размер ответа', BYTES_BUCKETS),
+        }
+
+    def observe(self, view, **values):
+        with self.lock:
+            for key, value in values.items():
+                if value is not None:
+                    self.histograms[key].observe(view, value)
+
+    def render(self) -> str:
+        with self.lock:
+            lines = [line for histogram in self.histograms.values() for line in histogram.render()]
+        stats = fragment_cache_stats()
+        for event in ('hits', 'misses'):
+            name = f'recipes_fragment_cache_{event}_total'
+            lines += [f'# TYPE {name} counter', f'{name} {stats[event]}']
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        timings = current_timings.get()
+        if timings is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.templates += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Стандартный бэкенд шаблонов, который учитывает время рендеринга в текущем запросе."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
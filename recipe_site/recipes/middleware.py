@@ -0,0 +1,146 @@
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.db import connections
+
+from .http_cache import PURGE_HEADER
+from .metrics import RequestTimings, current_timings, registry
+from .routers import ReplicaState, current_replica
+
+PIN_SESSION_KEY = '_replica_pin_until'
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет по имени представления: общее время, число и время SQL-запросов,
+    время рендеринга шаблонов и размер ответа.
+
+    Результат уходит в заголовок Server-Timing и в гистограммы для /metrics/.
+    Работает и в синхронном (WSGI), и в асинхронном (ASGI) режиме.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with self.wrap_connections(timings):
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        # Соединения с базой привязаны к потоку: обёртки ставим в том потоке,
+        # где sync_to_async выполняет ORM-запросы этого запроса.
+        stack = await sync_to_async(self.wrap_connections)(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            current_timings.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    def wrap_connections(self, timings):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self.sql_wrapper(timings)))
+        return stack
+
+    def finish(self, request, response, timings, total):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        size = None if response.streaming else len(response.content)
+        registry.observe(view, duration=total, sql=timings.sql, queries=timings.queries,
+                         templates=timings.templates, size=size)
+        response['Server-Timing'] = (
+            f'sql;dur={timings.sql * 1000:.1f};desc="{timings.queries} queries", '
+            f'tpl;dur={timings.templates * 1000:.1f}, '
+            f'total;dur={total * 1000:.1f}'
+        )
+        return response
+
+    @staticmethod
+    def sql_wrapper(timings):
+        def wrapper(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                timings.queries += 1
+                timings.sql += time.perf_counter() - started
+        return wrapper
+
+
+class ReplicaMiddleware:
+    """
+    Выбирает реплику для чтений запроса (см. recipes.routers).
+
+    На реплику идут только GET/HEAD. Если запрос что-то записал, сессия на
+    REPLICA_PIN_SECONDS «прилипает» к основной базе: пока реплика догоняет,
+    пользователь видит свои изменения. Обновление кэша nginx тоже читает
+    основную базу — иначе в кэш попала бы отстающая копия.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = ReplicaState(self.replica_for(request))
+        token = current_replica.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_replica.reset(token)
+        self.pin(request, state)
+        return response
+
+    async def __acall__(self, request):
+        state = ReplicaState(await sync_to_async(self.replica_for)(request))
+        token = current_replica.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_replica.reset(token)
+        self.pin(request, state)
+        return response
+
+    @staticmethod
+    def replica_for(request):
+        if not settings.DATABASE_REPLICAS or request.method not in ('GET', 'HEAD'):
+            return None
+        if request.headers.get(PURGE_HEADER):
+            return None
+        # Без cookie сессии прилипать нечему — и незачем её загружать.
+        if settings.SESSION_COOKIE_NAME in request.COOKIES and request.session.get(PIN_SESSION_KEY, 0) > time.time():
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    @staticmethod
+    def pin(request, state):
+        if state.wrote and settings.DATABASE_REPLICAS and hasattr(request, 'session'):
+            request.session[PIN_SESSION_KEY] = time.time() + settings.REPLICA_PIN_SECONDS
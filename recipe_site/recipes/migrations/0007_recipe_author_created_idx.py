@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-18 02:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_alter_category_name_alter_ingredient_name_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='recipe_author_created_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.7 on 2026-10-18 02:45
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+def build_search_index(apps, schema_editor):
+    """PostgreSQL: заполняет tsvector; SQLite: создаёт и заполняет таблицу FTS5."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        Recipe.objects.update(search_vector=(
+            django.contrib.postgres.search.SearchVector('title', weight='A', config='russian')
+            + django.contrib.postgres.search.SearchVector('description', weight='B', config='russian')
+        ))
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5("
+            "title, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            'INSERT INTO recipes_recipe_fts (rowid, title, description) '
+            'SELECT id, title, description FROM recipes_recipe'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE recipes_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_author_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+        ),
+        migrations.RunPython(build_search_index, drop_search_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 02:46
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_ingredients(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    counts = (RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+              .values('recipe').annotate(total=Count('id')).values('total'))
+    Recipe.objects.update(ingredient_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='recipeingredient',
+            index=models.Index(fields=['ingredient', 'recipe'], name='recipeingredient_posting_idx'),
+        ),
+        migrations.RunPython(count_ingredients, migrations.RunPython.noop),
+    ]
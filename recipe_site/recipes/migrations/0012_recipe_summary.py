@@ -0,0 +1,64 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+BUCKETS = (15, 30, 60, 120)
+
+
+def build_summaries(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeCategory = apps.get_model('recipes', 'RecipeCategory')
+    RecipeSummary = apps.get_model('recipes', 'RecipeSummary')
+    categories = {}
+    for recipe_id, name in RecipeCategory.objects.order_by('category__name').values_list('recipe_id',
+                                                                                         'category__name'):
+        categories.setdefault(recipe_id, []).append(name)
+    rows = Recipe.objects.values('id', 'author_id', 'author__username', 'title', 'description', 'cook_time',
+                                 'image', 'image_variants', 'ingredient_count', 'created_at', 'updated_at')
+    RecipeSummary.objects.bulk_create(
+        (RecipeSummary(recipe_id=row['id'], author_id=row['author_id'], author_username=row['author__username'],
+                       title=row['title'], excerpt=Truncator(row['description']).words(20),
+                       cook_time=row['cook_time'],
+                       cook_time_bucket=next((limit for limit in BUCKETS if row['cook_time'] <= limit), 0),
+                       image=row['image'], image_variants=row['image_variants'],
+                       ingredient_count=row['ingredient_count'], category_names=categories.get(row['id'], []),
+                       created_at=row['created_at'], updated_at=row['updated_at'])
+         for row in rows.iterator(chunk_size=5_000)),
+        batch_size=5_000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSummary',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='recipes.recipe')),
+                ('author_username', models.CharField(max_length=150)),
+                ('title', models.CharField(max_length=200)),
+                ('excerpt', models.TextField(blank=True)),
+                ('cook_time', models.PositiveIntegerField()),
+                ('cook_time_bucket', models.PositiveSmallIntegerField(choices=[(15, 'до 15 минут'), (30, 'до 30 минут'), (60, 'до часа'), (120, 'до 2 часов'), (0, 'больше 2 часов')])),
+                ('image', models.ImageField(blank=True, null=True, upload_to='recipes/')),
+                ('image_variants', models.JSONField(blank=True, default=dict)),
+                ('ingredient_count', models.PositiveIntegerField(default=0)),
+                ('category_names', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('author', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['author', '-created_at', '-recipe'], name='summary_author_created_idx'), models.Index(fields=['-created_at', '-recipe'], name='summary_created_idx')],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
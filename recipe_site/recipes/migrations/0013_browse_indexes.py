@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['cook_time', 'created_at'], name='recipe_cook_time_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipecategory',
+            index=models.Index(fields=['category', 'recipe'], name='recipecategory_category_idx'),
+        ),
+    ]
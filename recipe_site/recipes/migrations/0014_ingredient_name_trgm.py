@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:05
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+INDEX = django.contrib.postgres.indexes.GinIndex(
+    django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'),
+    name='ingredient_name_trgm_idx',
+)
+
+
+def add_trigram_index(apps, schema_editor):
+    """Класс операторов gin_trgm_ops есть только в PostgreSQL; в SQLite индекс не создаётся."""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('recipes', 'Ingredient'), INDEX)
+
+
+def remove_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('recipes', 'Ingredient'), INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_browse_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='ingredient', index=INDEX)],
+            database_operations=[migrations.RunPython(add_trigram_index, remove_trigram_index)],
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    """Профили создаются при регистрации; здесь — для пользователей, заведённых до этого или в обход сигнала."""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserProfile = apps.get_model('recipes', 'UserProfile')
+    missing = User.objects.filter(userprofile__isnull=True).values_list('pk', flat=True)
+    UserProfile.objects.bulk_create((UserProfile(user_id=pk) for pk in missing.iterator()), batch_size=5_000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_userprofile_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_distinct_ingredients(apps, schema_editor):
+    """Счётчики считали строки; ингредиент, указанный в рецепте дважды, учитывался два раза."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    RecipeSummary = apps.get_model('recipes', 'RecipeSummary')
+
+    def counts(recipe_field):
+        return Coalesce(Subquery(
+            RecipeIngredient.objects.filter(recipe=OuterRef(recipe_field)).order_by().values('recipe')
+            .annotate(total=Count('ingredient_id', distinct=True)).values('total')
+        ), 0)
+
+    Recipe.objects.update(ingredient_count=counts('pk'))
+    RecipeSummary.objects.update(ingredient_count=counts('recipe_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_create_missing_profiles'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_distinct_ingredients, migrations.RunPython.noop),
+    ]
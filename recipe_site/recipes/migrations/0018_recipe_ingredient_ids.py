@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 04:07
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db import migrations, models
+from django.db.models import OuterRef
+
+import recipes.models
+
+
+def fill_ingredient_ids(apps, schema_editor):
+    """Массив id ингредиентов рецепта нужен только PostgreSQL; в SQLite подбор идёт по связям."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    Recipe.objects.update(ingredient_ids=ArraySubquery(
+        RecipeIngredient.objects.filter(recipe=OuterRef('pk')).order_by('ingredient_id')
+        .values('ingredient_id').distinct()
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_count_distinct_ingredients'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_ids',
+            field=recipes.models.PostgresArrayField(base_field=models.IntegerField(), editable=False, null=True, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ingredient_ids'], name='recipe_ingredient_ids_idx'),
+        ),
+        migrations.RunPython(fill_ingredient_ids, migrations.RunPython.noop),
+    ]
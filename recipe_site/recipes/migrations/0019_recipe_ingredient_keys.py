@@ -0,0 +1,57 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:02
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+import recipes.models
+
+
+def fill_ingredient_keys(apps, schema_editor):
+    """
+    Ключи подбора, как services.ingredient_keys(): пары из четырёх самых редких ингредиентов
+    по статистике планировщика, у рецептов до трёх ингредиентов — сами id.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE recipes_recipeingredient')
+        cursor.execute(
+            "SELECT most_common_vals::text::integer[], most_common_freqs FROM pg_stats "
+            "WHERE schemaname = current_schema() AND tablename = 'recipes_recipeingredient' "
+            "AND attname = 'ingredient_id'"
+        )
+        row = cursor.fetchone()
+        common = [pk for pk, _ in sorted(zip(*row), key=lambda pair: -pair[1])] if row and row[0] else []
+        cursor.execute(
+            'UPDATE recipes_recipe SET ingredient_keys = CASE '
+            'WHEN cardinality(ingredient_ids) <= 3 THEN ingredient_ids::bigint[] '
+            'ELSE ARRAY('
+            'WITH rarest AS (SELECT e FROM unnest(ingredient_ids) AS e '
+            'ORDER BY array_position(%s::integer[], e) DESC NULLS FIRST, e LIMIT 4) '
+            'SELECT (a.e::bigint << 32) | b.e FROM rarest AS a JOIN rarest AS b ON a.e < b.e ORDER BY 1'
+            ') END',
+            [common],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_recipe_ingredient_ids'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_keys',
+            field=recipes.models.PostgresArrayField(base_field=models.BigIntegerField(), editable=False, null=True, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ingredient_keys'], name='recipe_ingredient_keys_idx'),
+        ),
+        migrations.RunPython(fill_ingredient_keys, migrations.RunPython.noop),
+    ]
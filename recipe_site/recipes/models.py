@@ -1,5 +1,9 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Upper
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
@@ -9,18 +13,52 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(blank=True, verbose_name="О себе")
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True, verbose_name="Аватар")
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Профиль: {self.user.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+    @classmethod
+    def of(cls, user) -> 'UserProfile':
+        """
+        Профиль пользователя. Обычно он уже загружен вместе с пользователем; если профиля нет
+        (удалён в админке, пользователь заведён через bulk_create или loaddata) — создаётся.
+        """
+        try:
+            return user.userprofile
+        except cls.DoesNotExist:
+            profile, _ = cls.objects.get_or_create(user=user)
+            user.userprofile = profile
+            return profile
+
+    def changed_fields(self) -> list[str]:
+        """Поля, изменённые с загрузки из базы или последнего сохранения."""
+        loaded = getattr(self, '_loaded_values', {})
+        return [field.name for field in self._meta.concrete_fields
+                if field.attname in loaded and getattr(self, field.attname) != loaded[field.attname]]
+
 
 @receiver(post_save, sender=User)
 def create_or_update_user_profile(sender, instance, created, **kwargs):
-    """Автоматически создаёт профиль пользователя после регистрации."""
+    """
+    Создаёт профиль при регистрации. Дальше профиль сохраняется вместе с пользователем,
+    только если он загружен и в нём что-то поменяли, — вход (last_login) профиль не трогает.
+    """
     if created:
         UserProfile.objects.create(user=instance)
-    else:
-        instance.userprofile.save()
+    elif User.userprofile.is_cached(instance) and (changed := instance.userprofile.changed_fields()):
+        instance.userprofile.save(update_fields=[*changed, 'updated_at'])
 
 
 class Category(models.Model):
@@ -35,10 +73,37 @@ class Ingredient(models.Model):
     """Ингредиент для рецепта."""
     name = models.CharField(max_length=100, unique=True, verbose_name="Название ингредиента")
 
+    class Meta:
+        indexes = [
+            # Триграммы по UPPER(name): префиксный LIKE и нечёткий поиск (%) для автодополнения.
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='ingredient_name_trgm_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class PostgresArrayField(ArrayField):
+    """
+    ArrayField, который не мешает SQLite: там столбец всегда NULL, а приведение `%s::integer[]`
+    в INSERT и UPDATE было бы синтаксической ошибкой.
+    """
+
+    def get_placeholder(self, value, compiler, connection):
+        if connection.vendor != 'postgresql':
+            return '%s'
+        return super().get_placeholder(value, compiler, connection)
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_detail(self):
+        """Автор, ингредиенты с названиями и категории — фиксированным числом запросов."""
+        return self.select_related('author').prefetch_related(
+            models.Prefetch('ingredients', queryset=RecipeIngredient.objects.select_related('ingredient')),
+            'categories',
+        )
+
+
 class Recipe(models.Model):
     """Основная модель рецепта."""
     title = models.CharField(max_length=200, verbose_name="Название")
@@ -46,9 +111,33 @@ class Recipe(models.Model):
     steps = models.TextField(verbose_name="Шаги приготовления")
     cook_time = models.PositiveIntegerField(verbose_name="Время приготовления (мин)")
     image = models.ImageField(upload_to='recipes/', blank=True, null=True, verbose_name="Изображение")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     author = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Автор")
     categories = models.ManyToManyField(Category, through='RecipeCategory', verbose_name="Категории")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    ingredient_count = models.PositiveIntegerField(default=0, editable=False)
+    # Отсортированные id различных ингредиентов — инвертированный индекс «Что приготовить» (GIN).
+    # Заполняется только в PostgreSQL; в SQLite остаётся NULL.
+    ingredient_ids = PostgresArrayField(models.IntegerField(), null=True, editable=False)
+    # Ключи подбора с допуском до KEY_MAX_MISSING (см. services.ingredient_keys): пары из
+    # KEY_INGREDIENTS самых редких ингредиентов рецепта, у небольших рецептов — сами id.
+    ingredient_keys = PostgresArrayField(models.BigIntegerField(), null=True, editable=False)
+
+    KEY_MAX_MISSING = 2
+    KEY_INGREDIENTS = KEY_MAX_MISSING + 2
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', '-created_at', '-id'], name='recipe_author_created_idx'),
+            models.Index(fields=['cook_time', 'created_at'], name='recipe_cook_time_created_idx'),
+            GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+            GinIndex(fields=['ingredient_ids'], name='recipe_ingredient_ids_idx'),
+            GinIndex(fields=['ingredient_keys'], name='recipe_ingredient_keys_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -69,6 +158,11 @@ class RecipeIngredient(models.Model):
     amount = models.FloatField(verbose_name="Количество")
     unit = models.CharField(max_length=10, choices=UNIT_CHOICES, default='г', verbose_name="Ед. изм.")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['ingredient', 'recipe'], name='recipeingredient_posting_idx'),
+        ]
+
     def __str__(self):
         return f"{self.ingredient.name} — {self.amount} {self.unit}"
 
@@ -80,6 +174,52 @@ class RecipeCategory(models.Model):
 
     class Meta:
         unique_together = ('recipe', 'category')
+        indexes = [
+            models.Index(fields=['category', 'recipe'], name='recipecategory_category_idx'),
+        ]
 
     def __str__(self):
         return f"{self.recipe.title} → {self.category.name}"
+
+
+class RecipeSummary(models.Model):
+    """
+    Готовая строка для списков рецептов: всё, что показывают карточки, без JOIN.
+
+    Поддерживается сигналами из recipes.summary, перестраивается командой rebuild_summaries.
+    """
+    # Верхняя граница корзины в минутах; 0 — дольше самой большой границы.
+    COOK_TIME_BUCKETS = [
+        (15, 'до 15 минут'),
+        (30, 'до 30 минут'),
+        (60, 'до часа'),
+        (120, 'до 2 часов'),
+        (0, 'больше 2 часов'),
+    ]
+
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', db_index=False)
+    author_username = models.CharField(max_length=150)
+    title = models.CharField(max_length=200)
+    excerpt = models.TextField(blank=True)
+    cook_time = models.PositiveIntegerField()
+    cook_time_bucket = models.PositiveSmallIntegerField(choices=COOK_TIME_BUCKETS)
+    image = models.ImageField(upload_to='recipes/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True)
+    ingredient_count = models.PositiveIntegerField(default=0)
+    category_names = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', '-created_at', '-recipe'], name='summary_author_created_idx'),
+            models.Index(fields=['-created_at', '-recipe'], name='summary_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    @classmethod
+    def cook_time_bucket_for(cls, cook_time: int) -> int:
+        return next((limit for limit, _ in cls.COOK_TIME_BUCKETS if limit and cook_time <= limit), 0)
@@ -0,0 +1,58 @@
+"""
+Чтение с реплик, запись — в основную базу.
+
+Реплику на время запроса выбирает ReplicaMiddleware (только для GET/HEAD без
+«прилипания»); вне запросов — команды, фоновые потоки, тесты — всё идёт в default.
+
+Локально роутер проверяется на двух SQLite-базах, где реплика — та же база
+под другим алиасом:
+
+    DATABASES = {
+        'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db.sqlite3'},
+        'replica_1': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db.sqlite3',
+                      'TEST': {'MIRROR': 'default'}},
+    }
+    DATABASE_REPLICAS = ['replica_1']
+
+(для честной проверки отставания — отдельный файл, куда периодически копируется основной).
+"""
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Сессии читаются до выбора реплики и решают, «прилип» ли пользователь, — только из основной базы.
+PRIMARY_APPS = {'sessions'}
+
+
+@dataclass
+class ReplicaState:
+    """Реплика текущего запроса; после первой записи чтения до конца запроса идут в основную базу."""
+    alias: str | None = None
+    wrote: bool = False
+
+
+current_replica: ContextVar[ReplicaState | None] = ContextVar('current_replica', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = current_replica.get()
+        if state is None or state.alias is None or state.wrote or model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = current_replica.get()
+        if state is not None and model._meta.app_label not in PRIMARY_APPS:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплики получают схему репликацией из основной базы.
+        return False if db in settings.DATABASE_REPLICAS else None
@@ -0,0 +1,306 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.expressions import ArraySubquery
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, TrigramSimilarity)
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import (Case, Count, F, Func, IntegerField, OuterRef, Q,
+                              QuerySet, Subquery, Value, When)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Upper
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import (Ingredient, Recipe, RecipeCategory, RecipeIngredient,
+                     RecipeSummary)
+from .services import (bulk_write_in_progress, common_ingredient_ids,
+                       ingredient_keys, recipes_page, selection_keys)
+
+SEARCH_CONFIG = 'russian'
+SEARCH_RESULTS_LIMIT = 50
+FTS_TABLE = 'recipes_recipe_fts'
+MATCH_RESULTS_LIMIT = 50
+SUGGEST_LIMIT = 10
+SUGGEST_MIN_LENGTH = 2
+FACETS_CACHE_KEY = 'browse:facets'
+
+
+def recipe_search_vector() -> SearchVector:
+    """Название важнее описания: веса A и B."""
+    return (SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG))
+
+
+def update_search_index(recipe_ids: list[int]) -> None:
+    """Пересчитывает поисковый индекс для указанных рецептов."""
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(pk__in=recipe_ids).update(search_vector=recipe_search_vector())
+        return
+    rows = Recipe.objects.filter(pk__in=recipe_ids).values_list('id', 'title', 'description')
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in recipe_ids])
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)', rows)
+
+
+def remove_from_search_index(recipe_id: int) -> None:
+    if connection.vendor == 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id])
+
+
+def fts5_query(text: str) -> str:
+    """Запрос FTS5: все слова обязательны, каждое ищется как префикс (стемминга для русского в SQLite нет)."""
+    words = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def tsquery_prefix(text: str) -> str:
+    """Запрос to_tsquery: все слова обязательны, каждое — префикс лексемы, как и в FTS5 («ябло» находит «яблоками»)."""
+    return ' & '.join(f'{word}:*' for word in re.findall(r'\w+', text))
+
+
+def search_recipes(text: str, limit: int = SEARCH_RESULTS_LIMIT) -> QuerySet | list[Recipe]:
+    """
+    Полнотекстовый поиск рецептов, отсортированный по релевантности.
+
+    PostgreSQL — хранимый tsvector с русским стеммингом и GIN-индексом,
+    SQLite (локальная разработка) — виртуальная таблица FTS5.
+    """
+    if not text.strip():
+        return []
+    postgres = connection.vendor == 'postgresql'
+    match = tsquery_prefix(text) if postgres else fts5_query(text)
+    if not match:
+        return []
+    if postgres:
+        query = SearchQuery(match, config=SEARCH_CONFIG, search_type='raw')
+        return (Recipe.objects.filter(search_vector=query)
+                .annotate(rank=SearchRank(F('search_vector'), query))
+                .order_by('-rank', '-created_at')[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, 10.0, 1.0) LIMIT %s',
+            [match, limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    recipes = Recipe.objects.in_bulk(ids)
+    return [recipes[pk] for pk in ids if pk in recipes]
+
+
+def recipe_text_filter(text: str) -> Q | None:
+    """
+    Условие «рецепт находится по тексту» для произвольного queryset (поиск в админке):
+    tsvector с GIN-индексом или rowid из FTS5 вместо icontains по всей таблице. None — искать нечего.
+    """
+    if not text.strip():
+        return None
+    postgres = connection.vendor == 'postgresql'
+    match = tsquery_prefix(text) if postgres else fts5_query(text)
+    if not match:
+        return None
+    if postgres:
+        return Q(search_vector=SearchQuery(match, config=SEARCH_CONFIG, search_type='raw'))
+    return Q(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]))
+
+
+def suggest_ingredients(text: str, limit: int = SUGGEST_LIMIT) -> list[dict]:
+    """
+    Подсказки ингредиентов для автодополнения: строки `id` и `name`.
+
+    Сначала совпадения по началу названия, затем подстрока («пудр» — «Сахарная пудра») и похожие
+    по триграммам (опечатки) — все условия идут по GIN-индексу UPPER(name) gin_trgm_ops.
+    В SQLite — только префикс и подстрока.
+    """
+    text = text.strip()
+    if len(text) < SUGGEST_MIN_LENGTH:
+        return []
+    return list(ingredient_suggestions(text, connection.vendor).values('id', 'name')[:limit])
+
+
+def ingredient_suggestions(text: str, vendor: str) -> QuerySet:
+    """Запрос подсказок под конкретную СУБД; выполняет его suggest_ingredients."""
+    if vendor == 'postgresql':
+        # Лукап trigram_similar регистрирует приложение django.contrib.postgres.
+        upper = text.upper()
+        return (Ingredient.objects.annotate(upper_name=Upper('name'))
+                .filter(Q(upper_name__contains=upper) | Q(upper_name__trigram_similar=upper))
+                .annotate(prefix=Case(When(upper_name__startswith=upper, then=Value(0)), default=Value(1)),
+                          similarity=TrigramSimilarity('upper_name', upper))
+                .order_by('prefix', '-similarity', 'name'))
+    # UPPER и LIKE в SQLite не меняют регистр кириллицы: названия обычно с заглавной буквы.
+    starts = Q(name__startswith=text.capitalize()) | Q(name__istartswith=text)
+    return (Ingredient.objects.filter(starts | Q(name__contains=text.lower()))
+            .annotate(prefix=Case(When(starts, then=Value(0)), default=Value(1)))
+            .order_by('prefix', 'name'))
+
+
+class SharedElements(Func):
+    """Число общих элементов двух массивов без повторов (PostgreSQL)."""
+    template = 'cardinality(ARRAY(SELECT unnest(%(expressions)s)))'
+    arg_joiner = ') INTERSECT SELECT unnest('
+    output_field = IntegerField()
+
+
+def update_ingredient_counts(recipe_ids: list[int]) -> None:
+    """
+    Пересчитывает денормализованное число различных ингредиентов у рецептов: «Что приготовить»
+    сравнивает с ним число совпавших различных ингредиентов. В PostgreSQL заодно
+    обновляет `Recipe.ingredient_ids` и `Recipe.ingredient_keys`, по которым идёт подбор.
+    """
+    ingredients = RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+    counts = ingredients.values('recipe').annotate(total=Count('ingredient_id', distinct=True)).values('total')
+    updates = {'ingredient_count': Coalesce(Subquery(counts), 0)}
+    if connection.vendor == 'postgresql':
+        updates['ingredient_ids'] = ArraySubquery(
+            ingredients.order_by('ingredient_id').values('ingredient_id').distinct()
+        )
+    Recipe.objects.filter(pk__in=recipe_ids).update(**updates)
+    if connection.vendor == 'postgresql':
+        common = common_ingredient_ids()
+        recipes = list(Recipe.objects.filter(pk__in=recipe_ids).only('ingredient_ids'))
+        for recipe in recipes:
+            recipe.ingredient_keys = ingredient_keys(recipe.ingredient_ids or [], common)
+        Recipe.objects.bulk_update(recipes, ['ingredient_keys'], batch_size=1_000)
+
+
+def recipes_by_ingredients(ingredient_ids: list[int], max_missing: int = 2,
+                           limit: int = MATCH_RESULTS_LIMIT) -> QuerySet:
+    """
+    «Что приготовить»: рецепты, которым не хватает не больше `max_missing` ингредиентов.
+    Возвращает строки с `recipe_id`, `title`, `matched` и `missing`.
+    """
+    return ingredient_matches(ingredient_ids, max_missing, connection.vendor)[:limit]
+
+
+def ingredient_matches(ingredient_ids: list[int], max_missing: int, vendor: str) -> QuerySet:
+    """
+    Запрос подбора под конкретную СУБД; выполняет его recipes_by_ingredients.
+
+    PostgreSQL — по готовым массивам с GIN-индексом: кандидаты — рецепты с общим ключом
+    (`Recipe.ingredient_keys`, пары редких ингредиентов), а при допуске больше
+    Recipe.KEY_MAX_MISSING — с хотя бы одним выбранным ингредиентом (&&); ингредиентов
+    у кандидата не больше, чем выбрано плюс допуск, а совпадения считаются в строке
+    рецепта — без GROUP BY по связям.
+    SQLite (локальная разработка) группирует строки выбранных ингредиентов
+    (индекс ingredient, recipe) и сравнивает число совпадений с `Recipe.ingredient_count`.
+    """
+    if vendor == 'postgresql':
+        selected = sorted(set(ingredient_ids))
+        if max_missing <= Recipe.KEY_MAX_MISSING:
+            candidates = Q(ingredient_keys__overlap=selection_keys(selected))
+        else:
+            candidates = Q(ingredient_ids__overlap=selected)
+        return (Recipe.objects.filter(candidates, ingredient_count__lte=len(selected) + max_missing)
+                .annotate(matched=SharedElements('ingredient_ids',
+                                                 Value(selected, output_field=ArrayField(IntegerField()))))
+                .annotate(missing=F('ingredient_count') - F('matched'))
+                .filter(missing__lte=max_missing)
+                .order_by('missing', '-matched', 'pk')
+                .values('title', 'matched', 'missing', recipe_id=F('pk')))
+    return (RecipeIngredient.objects.filter(ingredient_id__in=ingredient_ids)
+            .values('recipe_id', title=F('recipe__title'))
+            .annotate(matched=Count('ingredient_id', distinct=True))
+            .annotate(missing=F('recipe__ingredient_count') - F('matched'))
+            .filter(missing__lte=max_missing)
+            .order_by('missing', '-matched', 'recipe_id'))
+
+
+def cook_time_filter(buckets, prefix: str = '') -> Q:
+    """Условие по выбранным корзинам времени (RecipeSummary.COOK_TIME_BUCKETS), выбор внутри фасета — «или»."""
+    limits = sorted(limit for limit, _ in RecipeSummary.COOK_TIME_BUCKETS if limit)
+    field = f'{prefix}cook_time'
+    condition = Q()
+    for bucket in buckets:
+        if not bucket:
+            condition |= Q(**{f'{field}__gt': limits[-1]})
+            continue
+        lower = max((limit for limit in limits if limit < bucket), default=None)
+        bounds = {f'{field}__lte': bucket}
+        if lower is not None:
+            bounds[f'{field}__gt'] = lower
+        condition |= Q(**bounds)
+    return condition
+
+
+def category_filter(category_ids) -> Q:
+    """Рецепты хотя бы из одной категории — подзапрос по индексу (category, recipe)."""
+    if not category_ids:
+        return Q()
+    return Q(pk__in=RecipeCategory.objects.filter(category_id__in=category_ids).values('recipe_id'))
+
+
+def browse_recipes(category_ids, buckets, cursor: str | None = None) -> tuple[list[RecipeSummary], str | None]:
+    """
+    Страница каталога с фильтрами по категориям и времени приготовления.
+
+    Фильтры между фасетами объединяются через «и». Keyset-страница id берётся из Recipe,
+    строки для показа — из сводки.
+    """
+    recipes = Recipe.objects.filter(category_filter(category_ids) & cook_time_filter(buckets)).only('created_at')
+    page, next_cursor = recipes_page(recipes, cursor)
+    summaries = RecipeSummary.objects.in_bulk([recipe.pk for recipe in page])
+    return [summaries[recipe.pk] for recipe in page if recipe.pk in summaries], next_cursor
+
+
+def browse_facets(category_ids, buckets) -> dict[str, dict[int, int]]:
+    """
+    Счётчики фасетов для текущего выбора, по запросу на фасет.
+
+    Каждый фасет считается с фильтрами остальных фасетов, но без своего:
+    так видно, сколько рецептов добавит ещё одна отмеченная категория.
+    Без фильтров счётчики общие для всех и берутся из кэша (см. catalogue_facets).
+    """
+    if not category_ids and not buckets and settings.FACETS_CACHE_TIMEOUT:
+        facets = cache.get(FACETS_CACHE_KEY)
+        if facets is None:
+            facets = catalogue_facets()
+            cache.set(FACETS_CACHE_KEY, facets, timeout=settings.FACETS_CACHE_TIMEOUT)
+        return facets
+    categories = dict(RecipeCategory.objects.filter(cook_time_filter(buckets, prefix='recipe__'))
+                      .order_by().values('category_id').annotate(total=Count('recipe_id'))
+                      .values_list('category_id', 'total'))
+    cook_times = Recipe.objects.filter(category_filter(category_ids)).aggregate(**{
+        str(limit): Count('pk', filter=cook_time_filter([limit])) for limit, _ in RecipeSummary.COOK_TIME_BUCKETS
+    })
+    return {'categories': categories, 'cook_time': {int(limit): total for limit, total in cook_times.items()}}
+
+
+def catalogue_facets() -> dict[str, dict[int, int]]:
+    """
+    Счётчики каталога без фильтров: группировка связей по категории и сводок по готовой корзине времени.
+
+    Оба запроса читают всю таблицу, поэтому browse_facets держит результат в кэше
+    FACETS_CACHE_TIMEOUT секунд — на это время новые рецепты могут не попасть в счётчики.
+    """
+    categories = dict(RecipeCategory.objects.order_by().values('category_id')
+                      .annotate(total=Count('recipe_id')).values_list('category_id', 'total'))
+    cook_times = dict(RecipeSummary.objects.order_by().values('cook_time_bucket')
+                      .annotate(total=Count('pk')).values_list('cook_time_bucket', 'total'))
+    return {'categories': categories,
+            'cook_time': {limit: cook_times.get(limit, 0) for limit, _ in RecipeSummary.COOK_TIME_BUCKETS}}
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, **kwargs):
+    """Обновляет поисковый индекс после сохранения рецепта."""
+    update_search_index([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    remove_from_search_index(instance.pk)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def count_recipe_ingredients(sender, instance, origin=None, **kwargs):
+    """Держит `Recipe.ingredient_count` в актуальном состоянии."""
+    if isinstance(origin, Recipe) or bulk_write_in_progress():
+        return  # рецепт удаляется целиком или счётчик уже выставлен сервисом записи
+    update_ingredient_counts([instance.recipe_id])
@@ -0,0 +1,310 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from itertools import combinations
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Q, QuerySet, Sum, Value, When
+
+from .models import Recipe, RecipeCategory, RecipeIngredient, RecipeSummary
+
+RANDOM_SAMPLE_ATTEMPTS = 3
+RECIPES_PAGE_SIZE = 20
+
+_bulk_write = ContextVar('bulk_write', default=False)
+
+# Ложки пересчитываются в миллилитры; остальные единицы складываются как есть.
+UNIT_CONVERSIONS = {
+    'ч.л.': ('мл', 5),
+    'ст.л.': ('мл', 15),
+}
+SHOPPING_LIST_MAX_RECIPES = 500
+SHOPPING_LIST_MAX_SERVINGS = 1000
+SHOPPING_LIST_CHUNK_SIZE = 500
+
+
+def random_recipes(count: int = 5) -> list[RecipeSummary]:
+    """
+    Возвращает сводки до `count` случайных рецептов без полного сканирования таблицы.
+
+    Берёт границы первичного ключа двумя запросами по индексу, выбирает случайные id из диапазона
+    и догружает недостающие повторными попытками, если попали в «дыры». При таком выборе каждый
+    существующий рецепт выбирается с одинаковой вероятностью.
+
+    Если диапазон id сильно разрежен и попыток не хватило, остаток добирается поиском ближайшего
+    существующего id после случайной точки — тоже по индексу, ограниченным числом запросов
+    (рецепты сразу после больших «дыр» в этом случае выпадают чаще).
+    """
+    ids = RecipeSummary.objects.order_by('pk').values_list('pk', flat=True)
+    low, high = ids.first(), ids.last()
+    if low is None:
+        return []
+
+    picked: dict[int, RecipeSummary] = {}
+    for _ in range(RANDOM_SAMPLE_ATTEMPTS):
+        need = count - len(picked)
+        if need <= 0:
+            break
+        hits = list(RecipeSummary.objects.filter(pk__in=random_candidates(low, high, need, picked)))
+        add_random_hits(picked, hits, need)
+
+    # Уже выбранные исключены, поэтому каждый поиск добавляет новый рецепт: не больше двух
+    # запросов с LIMIT 1 на недостающий.
+    for _ in range(count - len(picked)):
+        rest = RecipeSummary.objects.exclude(pk__in=list(picked)).order_by('pk')
+        # Ближайший id после случайной точки; за последним — по кругу с начала.
+        recipe = rest.filter(pk__gte=random.randint(low, high)).first() or rest.first()
+        if recipe is None:
+            break  # рецептов меньше, чем просили
+        picked[recipe.pk] = recipe
+    return shuffled(picked)
+
+
+async def arandom_recipes(count: int = 5) -> list[RecipeSummary]:
+    """Асинхронная версия random_recipes() — те же запросы через async ORM."""
+    ids = RecipeSummary.objects.order_by('pk').values_list('pk', flat=True)
+    low, high = await ids.afirst(), await ids.alast()
+    if low is None:
+        return []
+
+    picked: dict[int, RecipeSummary] = {}
+    for _ in range(RANDOM_SAMPLE_ATTEMPTS):
+        need = count - len(picked)
+        if need <= 0:
+            break
+        candidates = random_candidates(low, high, need, picked)
+        hits = [recipe async for recipe in RecipeSummary.objects.filter(pk__in=candidates)]
+        add_random_hits(picked, hits, need)
+
+    for _ in range(count - len(picked)):
+        rest = RecipeSummary.objects.exclude(pk__in=list(picked)).order_by('pk')
+        recipe = await rest.filter(pk__gte=random.randint(low, high)).afirst() or await rest.afirst()
+        if recipe is None:
+            break
+        picked[recipe.pk] = recipe
+    return shuffled(picked)
+
+
+def random_candidates(low: int, high: int, need: int, picked: dict) -> set[int]:
+    """Случайные id из диапазона — вдвое больше нужного, с запасом на «дыры»; без уже выбранных."""
+    return set(random.sample(range(low, high + 1), min(high - low + 1, need * 2))) - picked.keys()
+
+
+def add_random_hits(picked: dict, hits: list[RecipeSummary], need: int) -> None:
+    random.shuffle(hits)
+    picked.update((recipe.pk, recipe) for recipe in hits[:need])
+
+
+def shuffled(picked: dict) -> list[RecipeSummary]:
+    recipes = list(picked.values())
+    random.shuffle(recipes)
+    return recipes
+
+
+def encode_cursor(recipe: Recipe) -> str:
+    """Курсор страницы — дата создания и id последнего показанного рецепта."""
+    return f'{recipe.created_at.isoformat()}_{recipe.pk}'
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int] | None:
+    try:
+        created_at, pk = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except ValueError:
+        return None
+
+
+def page_queryset(queryset: QuerySet, cursor: str | None, size: int) -> QuerySet:
+    """Рецепты (или их сводки) после курсора в порядке (created_at, id) — на один больше размера страницы."""
+    queryset = queryset.order_by('-created_at', '-pk')
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    return queryset[:size + 1]
+
+
+def split_page(recipes: list[Recipe], size: int) -> tuple[list[Recipe], str | None]:
+    next_cursor = encode_cursor(recipes[size - 1]) if len(recipes) > size else None
+    return recipes[:size], next_cursor
+
+
+def recipes_page(queryset: QuerySet, cursor: str | None = None,
+                 size: int = RECIPES_PAGE_SIZE) -> tuple[list[Recipe], str | None]:
+    """
+    Keyset-пагинация по (created_at, id): страница стоит одинаково на любой глубине.
+
+    Возвращает рецепты страницы и курсор следующей страницы (или None).
+    """
+    return split_page(list(page_queryset(queryset, cursor, size)), size)
+
+
+async def arecipes_page(queryset: QuerySet, cursor: str | None = None,
+                        size: int = RECIPES_PAGE_SIZE) -> tuple[list[Recipe], str | None]:
+    """Асинхронная версия recipes_page()."""
+    return split_page([recipe async for recipe in page_queryset(queryset, cursor, size)], size)
+
+
+def streaming_content(request, chunks):
+    """
+    Содержимое StreamingHttpResponse из синхронного генератора пачек.
+
+    Под ASGI Django читает синхронный генератор в список целиком и только потом отправляет
+    (StreamingHttpResponse.__aiter__) — там отдаётся асинхронный итератор, который берёт
+    следующую пачку в потоке ORM через sync_to_async. Под WSGI генератор отдаётся как есть.
+    """
+    if isinstance(request, ASGIRequest):
+        return achunks(iter(chunks))
+    return chunks
+
+
+async def achunks(chunks):
+    next_chunk = sync_to_async(next)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Клиент мог оборвать загрузку: курсор генератора закрывается в том же потоке.
+        if hasattr(chunks, 'close'):
+            await sync_to_async(chunks.close)()
+
+
+def bulk_write_in_progress() -> bool:
+    """Идёт пакетная запись рецепта: построчные обработчики сигналов ничего не пересчитывают."""
+    return _bulk_write.get()
+
+
+@contextmanager
+def bulk_write():
+    token = _bulk_write.set(True)
+    try:
+        yield
+    finally:
+        _bulk_write.reset(token)
+
+
+def common_ingredient_ids() -> list[int]:
+    """
+    Самые частые в рецептах ингредиенты, от частых к редким, — из статистики планировщика
+    PostgreSQL (pg_stats) без подсчёта по таблице. До первого ANALYZE список пуст.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT most_common_vals::text::integer[], most_common_freqs FROM pg_stats '
+            'WHERE schemaname = current_schema() AND tablename = %s AND attname = %s',
+            [RecipeIngredient._meta.db_table, RecipeIngredient._meta.get_field('ingredient').column],
+        )
+        row = cursor.fetchone()
+    if not row or row[0] is None:
+        return []
+    return [pk for pk, _ in sorted(zip(*row), key=lambda pair: -pair[1])]
+
+
+def ingredient_pair(first: int, second: int) -> int:
+    """Ключ пары ингредиентов: меньший id в старших 32 битах. Не пересекается с ключами-id."""
+    low, high = sorted((first, second))
+    return low << 32 | high
+
+
+def ingredient_keys(ingredient_ids, common: list[int]) -> list[int]:
+    """
+    Ключи рецепта для подбора «не хватает не больше Recipe.KEY_MAX_MISSING».
+
+    Такому рецепту из любых Recipe.KEY_INGREDIENTS его ингредиентов не хватает не больше
+    KEY_MAX_MISSING, то есть хотя бы два выбраны — значит, выбрана целиком одна из их пар.
+    Пары берутся из самых редких ингредиентов (сначала не попавшие в `common`): по «соли»
+    совпадает почти каждый рецепт. Рецепту из KEY_MAX_MISSING + 1 ингредиентов и меньше
+    хватает одного выбранного — его ключи сами id.
+    """
+    distinct = set(ingredient_ids)
+    if len(distinct) <= Recipe.KEY_MAX_MISSING + 1:
+        return sorted(distinct)
+    rank = {pk: position for position, pk in enumerate(common)}
+    rarest = sorted(distinct, key=lambda pk: (-rank.get(pk, len(common)), pk))[:Recipe.KEY_INGREDIENTS]
+    return sorted(ingredient_pair(first, second) for first, second in combinations(rarest, 2))
+
+
+def selection_keys(ingredient_ids) -> list[int]:
+    """Ключи, по которым выбранные ингредиенты находят рецепты: id и все их пары."""
+    selected = sorted(set(ingredient_ids))
+    return selected + [ingredient_pair(first, second) for first, second in combinations(selected, 2)]
+
+
+def save_recipe(form, formset, author=None) -> Recipe:
+    """
+    Сохраняет рецепт из RecipeForm и RecipeIngredientFormSet в одной транзакции.
+
+    Ингредиенты и категории сравниваются с сохранёнными и пишутся пачками
+    (bulk_create, bulk_update, один DELETE) вместо запроса на каждую строку формсета;
+    сводка для списков пересчитывается один раз в конце.
+    """
+    deleted_forms = set(formset.deleted_forms)
+    to_create, to_update, to_delete, ingredient_ids = [], [], [], set()
+    for row in formset.forms:
+        if row in deleted_forms:
+            if row.instance.pk:
+                to_delete.append(row.instance.pk)
+        elif row.instance.pk:
+            ingredient_ids.add(row.instance.ingredient_id)
+            if row.has_changed():
+                to_update.append(row.instance)
+        elif row.has_changed():
+            ingredient_ids.add(row.instance.ingredient_id)
+            to_create.append(row.instance)
+
+    with transaction.atomic(), bulk_write():
+        recipe = form.save(commit=False)
+        is_new = recipe.pk is None
+        if author is not None:
+            recipe.author = author
+        # Различные ингредиенты, как в update_ingredient_counts: повтор строки не добавляет «нужного».
+        recipe.ingredient_count = len(ingredient_ids)
+        if connection.vendor == 'postgresql':
+            # Массивы для подбора, см. search.ingredient_matches.
+            recipe.ingredient_ids = sorted(ingredient_ids)
+            recipe.ingredient_keys = ingredient_keys(ingredient_ids, common_ingredient_ids())
+        recipe.save()
+
+        if to_delete:
+            RecipeIngredient.objects.filter(recipe=recipe, pk__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['ingredient', 'amount', 'unit'])
+        for item in to_create:
+            item.recipe = recipe
+        RecipeIngredient.objects.bulk_create(to_create)
+
+        categories = {category.pk for category in form.cleaned_data['categories']}
+        stored = set() if is_new else set(
+            RecipeCategory.objects.filter(recipe=recipe).values_list('category_id', flat=True)
+        )
+        RecipeCategory.objects.bulk_create(
+            RecipeCategory(recipe=recipe, category_id=category_id) for category_id in categories - stored
+        )
+        if stored - categories:
+            RecipeCategory.objects.filter(recipe=recipe, category_id__in=stored - categories).delete()
+
+        # Импорт здесь: summary сам импортирует services.
+        from .summary import refresh_summaries
+        refresh_summaries([recipe.pk])
+    return recipe
+
+
+def shopping_list(recipe_ids: list[int], servings: float = 1) -> QuerySet:
+    """
+    Сводный список покупок одним агрегирующим запросом.
+
+    Ложки приводятся к миллилитрам по UNIT_CONVERSIONS прямо в SQL, количества
+    суммируются по ингредиенту и единице и умножаются на `servings`.
+    Строки: `name`, `normalized_unit`, `total`.
+    """
+    unit = Case(*(When(unit=source, then=Value(target)) for source, (target, _) in UNIT_CONVERSIONS.items()),
+                default=F('unit'))
+    factor = Case(*(When(unit=source, then=Value(float(ratio))) for source, (_, ratio) in UNIT_CONVERSIONS.items()),
+                  default=Value(1.0), output_field=FloatField())
+    return (RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+            .values(name=F('ingredient__name'), normalized_unit=unit)
+            .annotate(total=Sum(F('amount') * factor) * servings)
+            .order_by('name', 'normalized_unit'))
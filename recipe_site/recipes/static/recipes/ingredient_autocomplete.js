@@ -0,0 +1,43 @@
+// Автодополнение ингредиентов: подсказки с сервера, в форму уходит только id.
+// Поле с data-multiple добавляет выбранный ингредиент флажком в список над собой.
+let suggestTimer;
+
+function addToList(input, option) {
+  const list = input.previousElementSibling;
+  input.value = "";
+  if (list.querySelector(`input[value="${option.dataset.id}"]`)) return;
+  const label = document.createElement("label");
+  label.className = "form-check";
+  const checkbox = document.createElement("input");
+  checkbox.type = "checkbox";
+  checkbox.className = "form-check-input";
+  checkbox.name = list.dataset.name;
+  checkbox.value = option.dataset.id;
+  checkbox.checked = true;
+  label.append(checkbox, ` ${option.value}`);
+  list.append(label);
+}
+
+document.addEventListener("input", (event) => {
+  const input = event.target;
+  if (!input.classList.contains("ingredient-autocomplete")) return;
+  const options = input.nextElementSibling;
+  const chosen = [...options.options].find((option) => option.value === input.value);
+  if (input.dataset.multiple) {
+    if (chosen) return addToList(input, chosen);
+  } else {
+    input.previousElementSibling.value = chosen ? chosen.dataset.id : "";
+  }
+  if (chosen || input.value.trim().length < 2) return;
+  clearTimeout(suggestTimer);
+  suggestTimer = setTimeout(async () => {
+    const response = await fetch(`${input.dataset.url}?q=${encodeURIComponent(input.value)}`);
+    const {results} = await response.json();
+    options.replaceChildren(...results.map(({id, name}) => {
+      const option = document.createElement("option");
+      option.value = name;
+      option.dataset.id = id;
+      return option;
+    }));
+  }, 200);
+});
@@ -0,0 +1,37 @@
+import gzip
+from pathlib import PurePosixPath
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+# Что имеет смысл сжимать: картинки и шрифты уже сжаты своими форматами.
+COMPRESSIBLE = {'.css', '.js', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico'}
+MIN_COMPRESS_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Имена с хэшем содержимого (их можно кэшировать навсегда) плюс готовый .gz рядом
+    с каждым хэшированным текстовым файлом — nginx отдаёт его через gzip_static, не сжимая на лету.
+    (.br не собираются: в образе nginx нет модуля ngx_brotli, отдавать их было бы некому.)
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if PurePosixPath(name).suffix in COMPRESSIBLE:
+                self.compress(name)
+
+    def compress(self, name: str) -> None:
+        with self.open(name) as file:
+            content = file.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) >= len(content):
+            return
+        if self.exists(name + '.gz'):
+            self.delete(name + '.gz')
+        self._save(name + '.gz', ContentFile(compressed))
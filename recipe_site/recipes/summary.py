@@ -0,0 +1,129 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from .models import (Category, Ingredient, Recipe, RecipeCategory,
+                     RecipeIngredient, RecipeSummary)
+from .services import bulk_write_in_progress
+
+SUMMARY_BATCH_SIZE = 1_000
+EXCERPT_WORDS = 20
+SUMMARY_FIELDS = [
+    'author', 'author_username', 'title', 'excerpt', 'cook_time', 'cook_time_bucket', 'image', 'image_variants',
+    'ingredient_count', 'category_names', 'created_at', 'updated_at',
+]
+
+
+def build_summaries(recipe_ids: list[int]) -> list[RecipeSummary]:
+    """Строки сводки для пачки рецептов — тремя запросами на пачку."""
+    categories = defaultdict(list)
+    for recipe_id, name in (RecipeCategory.objects.filter(recipe_id__in=recipe_ids)
+                            .order_by('category__name').values_list('recipe_id', 'category__name')):
+        categories[recipe_id].append(name)
+    counts = dict(RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).order_by()
+                  .values('recipe_id').annotate(total=Count('ingredient_id', distinct=True))
+                  .values_list('recipe_id', 'total'))
+    recipes = Recipe.objects.filter(pk__in=recipe_ids).values(
+        'id', 'author_id', 'author__username', 'title', 'description', 'cook_time', 'image', 'image_variants',
+        'created_at', 'updated_at',
+    )
+    return [
+        RecipeSummary(
+            recipe_id=row['id'],
+            author_id=row['author_id'],
+            author_username=row['author__username'],
+            title=row['title'],
+            excerpt=Truncator(row['description']).words(EXCERPT_WORDS),
+            cook_time=row['cook_time'],
+            cook_time_bucket=RecipeSummary.cook_time_bucket_for(row['cook_time']),
+            image=row['image'],
+            image_variants=row['image_variants'],
+            ingredient_count=counts.get(row['id'], 0),
+            category_names=categories[row['id']],
+            created_at=row['created_at'],
+            updated_at=row['updated_at'],
+        )
+        for row in recipes
+    ]
+
+
+def refresh_summaries(recipe_ids, batch_size: int = SUMMARY_BATCH_SIZE) -> None:
+    """Пересчитывает сводку рецептов (upsert); удалённые рецепты уходят из неё каскадом."""
+    recipe_ids = iter(recipe_ids)
+    while chunk := list(islice(recipe_ids, batch_size)):
+        RecipeSummary.objects.bulk_create(build_summaries(chunk), update_conflicts=True,
+                                          unique_fields=['recipe'], update_fields=SUMMARY_FIELDS)
+
+
+def rebuild_summaries(batch_size: int = SUMMARY_BATCH_SIZE) -> int:
+    """Перестраивает сводку целиком в одной транзакции; возвращает число строк."""
+    total = 0
+    with transaction.atomic():
+        RecipeSummary.objects.all().delete()
+        recipe_ids = Recipe.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=batch_size)
+        while chunk := list(islice(recipe_ids, batch_size)):
+            total += len(RecipeSummary.objects.bulk_create(build_summaries(chunk)))
+    return total
+
+
+def touch_recipes(recipes) -> None:
+    """Сдвигает версию рецептов (фрагменты кэша строятся заново) и обновляет их сводку."""
+    recipe_ids = list(recipes.values_list('pk', flat=True))
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+    refresh_summaries(recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    """save_recipe() обновляет сводку сам, после записи ингредиентов и категорий."""
+    if not bulk_write_in_progress():
+        refresh_summaries([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeCategory)
+@receiver(post_delete, sender=RecipeCategory)
+def recipe_part_changed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Recipe) or bulk_write_in_progress():
+        return
+    refresh_summaries([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.categories.through)
+def recipe_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_') or bulk_write_in_progress():
+        return
+    refresh_summaries((pk_set or ()) if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def category_renamed(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(Recipe.objects.filter(categories=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, update_fields=None, **kwargs):
+    """Страница рецепта показывает названия ингредиентов — её версия (ETag, фрагменты) должна сдвинуться."""
+    if created or (update_fields is not None and 'name' not in update_fields):
+        return
+    touch_recipes(Recipe.objects.filter(pk__in=RecipeIngredient.objects.filter(ingredient=instance)
+                                        .values('recipe_id')))
+
+
+@receiver(post_save, sender=User)
+def author_renamed(sender, instance, created, update_fields=None, **kwargs):
+    """Вход пользователя сохраняет только last_login — такие сохранения не проверяем."""
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    stale = RecipeSummary.objects.filter(author=instance).exclude(author_username=instance.username)
+    if stale.exists():
+        touch_recipes(Recipe.objects.filter(author=instance))
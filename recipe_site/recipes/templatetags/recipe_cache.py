@@ -0,0 +1,41 @@
+from django import template
+
+from ..cache import fragment_cache, fragment_key, record
+
+register = template.Library()
+
+
+class RecipeFragmentNode(template.Node):
+    def __init__(self, name, recipe, nodelist):
+        self.name = name
+        self.recipe = recipe
+        self.nodelist = nodelist
+
+    def render(self, context):
+        recipe = self.recipe.resolve(context)
+        key = fragment_key(self.name, recipe.pk, recipe.updated_at)
+        cache = fragment_cache()
+        content = cache.get(key)
+        if content is not None:
+            record('hits')
+            return content
+        record('misses')
+        content = self.nodelist.render(context)
+        cache.set(key, content)
+        return content
+
+
+@register.tag
+def recipe_fragment(parser, token):
+    """
+    Кэширует кусок шаблона по id и версии рецепта:
+
+        {% recipe_fragment 'card' recipe %} ... {% endrecipe_fragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' ожидает имя фрагмента и рецепт")
+    name = bits[1].strip('\'"')
+    nodelist = parser.parse(('endrecipe_fragment',))
+    parser.delete_first_token()
+    return RecipeFragmentNode(name, parser.compile_filter(bits[2]), nodelist)
@@ -0,0 +1,26 @@
+from django import template
+from django.core.files.storage import default_storage
+
+register = template.Library()
+
+
+@register.filter
+def srcset(variants, extension='jpeg'):
+    """
+    Значение атрибута srcset из вариантов изображения:
+
+        <img srcset="{{ recipe.image_variants|srcset:'webp' }}">
+    """
+    return ', '.join(
+        f'{default_storage.url(name)} {width}w'
+        for width, name in sorted((variants or {}).get(extension, {}).items(), key=lambda item: int(item[0]))
+    )
+
+
+@register.filter
+def variant_url(variants, width):
+    """URL JPEG-варианта не уже `width` (или пустая строка, если вариантов ещё нет)."""
+    jpeg = (variants or {}).get('jpeg', {})
+    widths = sorted(int(key) for key in jpeg)
+    fitting = [key for key in widths if key >= int(width)] or widths[-1:]
+    return default_storage.url(jpeg[str(fitting[0])]) if fitting else ''
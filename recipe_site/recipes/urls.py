@@ -1,13 +1,24 @@
+from django.conf import settings
 from django.contrib.auth import views as auth_views
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'recipes'
 
+if settings.ASYNC_VIEWS:
+    home, recipe_detail, user_profile_view = views.ahome, views.arecipe_detail, views.auser_profile_view
+else:
+    home, recipe_detail, user_profile_view = views.home, views.recipe_detail, views.user_profile_view
+
 urlpatterns = [
-    path('', views.home, name='home'),
-    path('recipe/<int:recipe_id>/', views.recipe_detail, name='recipe_detail'),
+    path('', home, name='home'),
+    path('recipe/<int:recipe_id>/', recipe_detail, name='recipe_detail'),
+    path('search/', views.search, name='search'),
+    path('browse/', views.browse, name='browse'),
+    path('cook/', views.what_can_i_cook, name='what_can_i_cook'),
+    path('ingredients/autocomplete/', views.ingredient_autocomplete, name='ingredient_autocomplete'),
+    path('shopping-list/', views.shopping_list_view, name='shopping_list'),
     path('add/', views.add_recipe, name='add_recipe'),
     path('delete/<int:recipe_id>/', views.delete_recipe, name='delete_recipe'),
     path('edit/<int:recipe_id>/', views.edit_recipe, name='edit_recipe'),
@@ -16,5 +27,9 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(next_page='recipes:home'), name='logout'),
     path('profile/', views.profile_view, name='profile'),
     path('profile/edit/', views.edit_profile, name='edit_profile'),
-    path('user/<str:username>/', views.user_profile_view, name='user_profile'),
+    path('user/<str:username>/', user_profile_view, name='user_profile'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('api/v1/recipes/', api.recipe_list, name='api_recipes'),
+    path('api/v1/recipes/export/', api.recipe_export, name='api_recipe_export'),
+    path('api/v1/recipes/<int:recipe_id>/', api.recipe_detail, name='api_recipe'),
 ]
@@ -1,30 +1,186 @@
+import csv
+import hmac
 
-import random
-
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import HttpRequest, HttpResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.db.models import Count, Max
+from django.http import (HttpRequest, HttpResponse, HttpResponseBadRequest,
+                         HttpResponseForbidden, JsonResponse,
+                         StreamingHttpResponse)
+from django.shortcuts import (aget_object_or_404, get_object_or_404, redirect,
+                              render)
 
-from .forms import (RecipeForm, RecipeIngredientFormSet, RegisterForm,
-                    UserProfileForm)
-from .models import Recipe, UserProfile
+from .cache import reference_objects
+from .forms import (BrowseForm, IngredientMatchForm, RecipeForm,
+                    RecipeIngredientFormSet, RegisterForm, UserProfileForm)
+from .http_cache import conditional_page
+from .metrics import registry
+from .models import Category, Recipe, RecipeSummary, UserProfile
+from .search import (browse_facets, browse_recipes, recipes_by_ingredients,
+                     search_recipes, suggest_ingredients)
+from .services import (SHOPPING_LIST_CHUNK_SIZE, SHOPPING_LIST_MAX_RECIPES,
+                       SHOPPING_LIST_MAX_SERVINGS, arandom_recipes,
+                       arecipes_page, random_recipes, recipes_page,
+                       save_recipe, shopping_list, streaming_content)
 
 
 def home(request: HttpRequest) -> HttpResponse:
     """Главная страница сайта — отображает до 5 случайных рецептов."""
-    recipes = list(Recipe.objects.all())
-    random_recipes = random.sample(recipes, min(len(recipes), 5)) if recipes else []
-    return render(request, 'recipes/home.html', {'recipes': random_recipes})
+    return render(request, 'recipes/home.html', {'recipes': random_recipes(5)})
+
+
+def recipe_page_version(request: HttpRequest, recipe_id: int):
+    updated_at = Recipe.objects.filter(pk=recipe_id).values_list('updated_at', flat=True).first()
+    return None if updated_at is None else (updated_at, ('recipe', recipe_id, updated_at.timestamp()))
+
 
+def user_page_version(request: HttpRequest, username: str):
+    """Версия публичного профиля: профиль, самый свежий рецепт и число рецептов (ловит удаления)."""
+    user = User.objects.filter(username=username).values('pk', 'userprofile__updated_at').first()
+    if user is None:
+        return None
+    recipes = RecipeSummary.objects.filter(author_id=user['pk']).aggregate(latest=Max('updated_at'),
+                                                                           total=Count('pk'))
+    versions = [version for version in (user['userprofile__updated_at'], recipes['latest']) if version]
+    if not versions:
+        return None
+    return max(versions), ('user', username, *(version.timestamp() for version in versions), recipes['total'],
+                           request.GET.get('after', ''))
 
+
+@conditional_page(recipe_page_version)
 def recipe_detail(request: HttpRequest, recipe_id: int) -> HttpResponse:
     """Подробная страница рецепта."""
-    recipe = get_object_or_404(Recipe, pk=recipe_id)
+    recipe = get_object_or_404(Recipe.objects.with_detail(), pk=recipe_id)
     return render(request, 'recipes/recipe_detail.html', {'recipe': recipe})
 
 
+# Асинхронные версии публичных страниц для ASGI (SERVER_MODE=asgi): чтение через
+# async ORM, рендеринг шаблона — в потоке, т.к. шаблоны обращаются к базе синхронно.
+arender = sync_to_async(render)
+
+
+async def ahome(request: HttpRequest) -> HttpResponse:
+    recipes = await arandom_recipes(5)
+    return await arender(request, 'recipes/home.html', {'recipes': recipes})
+
+
+@conditional_page(recipe_page_version)
+async def arecipe_detail(request: HttpRequest, recipe_id: int) -> HttpResponse:
+    recipe = await aget_object_or_404(Recipe.objects.with_detail(), pk=recipe_id)
+    return await arender(request, 'recipes/recipe_detail.html', {'recipe': recipe})
+
+
+def search(request: HttpRequest) -> HttpResponse:
+    """Полнотекстовый поиск по названию и описанию рецептов."""
+    query = request.GET.get('q', '').strip()
+    return render(request, 'recipes/search.html', {
+        'query': query,
+        'recipes': search_recipes(query),
+    })
+
+
+def browse(request: HttpRequest) -> HttpResponse:
+    """Каталог с фасетами: ?categories=1&categories=2&cook_time=30 — счётчики для каждого варианта."""
+    form = BrowseForm(request.GET)
+    # Неверный фильтр показывается с ошибкой, остальные фильтры продолжают работать.
+    form.is_valid()
+    category_ids = [category.pk for category in form.cleaned_data.get('categories', [])]
+    buckets = form.cleaned_data.get('cook_time', [])
+    recipes, next_cursor = browse_recipes(category_ids, buckets, request.GET.get('after'))
+    facets = browse_facets(category_ids, buckets)
+    filters = request.GET.copy()
+    filters.pop('after', None)
+    return render(request, 'recipes/browse.html', {
+        'form': form,
+        'recipes': recipes,
+        'next_cursor': next_cursor,
+        'filter_query': filters.urlencode(),
+        'category_facets': [(category, facets['categories'].get(category.pk, 0), category.pk in category_ids)
+                            for category in reference_objects(Category)],
+        'cook_time_facets': [(limit, label, facets['cook_time'][limit], limit in buckets)
+                             for limit, label in RecipeSummary.COOK_TIME_BUCKETS],
+    })
+
+
+def ingredient_autocomplete(request: HttpRequest) -> JsonResponse:
+    """Подсказки для поля ингредиента: ?q=мук → {"results": [{"id": 1, "name": "Мука"}, ...]}."""
+    return JsonResponse({'results': suggest_ingredients(request.GET.get('q', ''))})
+
+
+def what_can_i_cook(request: HttpRequest) -> HttpResponse:
+    """Рецепты, для которых хватает имеющихся ингредиентов (с допуском по недостающим)."""
+    form = IngredientMatchForm(request.GET or None)
+    matches = []
+    if form.is_valid():
+        max_missing = form.cleaned_data['max_missing']
+        matches = recipes_by_ingredients(
+            [ingredient.pk for ingredient in form.cleaned_data['ingredients']],
+            max_missing=2 if max_missing is None else max_missing,
+        )
+    return render(request, 'recipes/what_can_i_cook.html', {'form': form, 'matches': matches})
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: writerow возвращает готовую строку, а не пишет её."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def shopping_list_chunks(rows, header: str, line, chunk_size: int = SHOPPING_LIST_CHUNK_SIZE):
+    """Строки списка покупок кусками по `chunk_size` строк — по куску на пачку iterator()."""
+    chunk = [header]
+    for row in rows:
+        chunk.append(line(row))
+        if len(chunk) >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def shopping_list_view(request: HttpRequest) -> HttpResponse:
+    """
+    Список покупок по нескольким рецептам: ?recipes=1&recipes=2&servings=2&format=csv.
+
+    Отдаётся потоком (txt или csv), строки читаются из базы пачками.
+    """
+    try:
+        recipe_ids = [int(value) for value in request.GET.getlist('recipes')]
+        servings = float(request.GET.get('servings') or 1)
+    except ValueError:
+        return HttpResponseBadRequest('Некорректные параметры списка покупок.')
+    # Двойное сравнение отсекает nan, inf и огромные числа вроде 1e308 (в сумме давали бы inf).
+    if (not recipe_ids or len(recipe_ids) > SHOPPING_LIST_MAX_RECIPES
+            or not 0 < servings <= SHOPPING_LIST_MAX_SERVINGS):
+        return HttpResponseBadRequest(
+            f'Укажите от 1 до {SHOPPING_LIST_MAX_RECIPES} рецептов '
+            f'и число порций больше 0 и не больше {SHOPPING_LIST_MAX_SERVINGS}.'
+        )
+
+    rows = shopping_list(recipe_ids, servings).iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+    if request.GET.get('format') == 'csv':
+        # csv.writer экранирует «;», кавычки и переводы строк в названиях ингредиентов.
+        writer = csv.writer(Echo(), delimiter=';', lineterminator='\n')
+        chunks = shopping_list_chunks(
+            rows, writer.writerow(['Ингредиент', 'Количество', 'Ед. изм.']),
+            lambda row: writer.writerow([row['name'], f"{row['total']:g}", row['normalized_unit']]),
+        )
+        content_type, extension = 'text/csv; charset=utf-8', 'csv'
+    else:
+        chunks = shopping_list_chunks(
+            rows, 'Список покупок\n\n', lambda row: f"• {row['name']} — {row['total']:g} {row['normalized_unit']}\n",
+        )
+        content_type, extension = 'text/plain; charset=utf-8', 'txt'
+    response = StreamingHttpResponse(streaming_content(request, chunks), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="shopping-list.{extension}"'
+    return response
+
+
 @login_required
 def add_recipe(request: HttpRequest) -> HttpResponse:
     """
@@ -36,12 +192,7 @@ def add_recipe(request: HttpRequest) -> HttpResponse:
         form = RecipeForm(request.POST, request.FILES)
         formset = RecipeIngredientFormSet(request.POST)
         if form.is_valid() and formset.is_valid():
-            recipe = form.save(commit=False)
-            recipe.author = request.user
-            recipe.save()
-            form.save_m2m()
-            formset.instance = recipe
-            formset.save()
+            save_recipe(form, formset, author=request.user)
             return redirect('recipes:home')
     else:
         form = RecipeForm()
@@ -65,8 +216,7 @@ def edit_recipe(request: HttpRequest, recipe_id: int) -> HttpResponse:
         form = RecipeForm(request.POST, request.FILES, instance=recipe)
         formset = RecipeIngredientFormSet(request.POST, instance=recipe)
         if form.is_valid() and formset.is_valid():
-            form.save()
-            formset.save()
+            save_recipe(form, formset)
             return redirect('recipes:recipe_detail', recipe_id=recipe.id)
     else:
         form = RecipeForm(instance=recipe)
@@ -96,15 +246,18 @@ def delete_recipe(request: HttpRequest, recipe_id: int) -> HttpResponse:
 @login_required
 def profile_view(request: HttpRequest) -> HttpResponse:
     """Страница профиля пользователя (авторизованного)."""
-    profile, _ = UserProfile.objects.get_or_create(user=request.user)
-    recipes = Recipe.objects.filter(author=request.user).order_by('-created_at')
-    return render(request, 'recipes/profile.html', {'recipes': recipes, 'profile': profile})
+    recipes, next_cursor = recipes_page(RecipeSummary.objects.filter(author=request.user), request.GET.get('after'))
+    return render(request, 'recipes/profile.html', {
+        'recipes': recipes,
+        'next_cursor': next_cursor,
+        'profile': UserProfile.of(request.user),
+    })
 
 
 @login_required
 def edit_profile(request: HttpRequest) -> HttpResponse:
     """Редактирование профиля: описание и аватар."""
-    profile, _ = UserProfile.objects.get_or_create(user=request.user)
+    profile = UserProfile.of(request.user)
 
     if request.method == 'POST':
         form = UserProfileForm(request.POST, request.FILES, instance=profile)
@@ -117,15 +270,28 @@ def edit_profile(request: HttpRequest) -> HttpResponse:
     return render(request, 'recipes/edit_profile.html', {'form': form})
 
 
+@conditional_page(user_page_version)
 def user_profile_view(request: HttpRequest, username: str) -> HttpResponse:
     """Публичный профиль пользователя: список его рецептов."""
-    user = get_object_or_404(User, username=username)
-    profile, _ = UserProfile.objects.get_or_create(user=user)
-    recipes = Recipe.objects.filter(author=user).order_by('-created_at')
+    user = get_object_or_404(User.objects.select_related('userprofile'), username=username)
+    recipes, next_cursor = recipes_page(RecipeSummary.objects.filter(author=user), request.GET.get('after'))
     return render(request, 'recipes/user_profile.html', {
         'recipes': recipes,
+        'next_cursor': next_cursor,
+        'profile_user': user,
+        'profile': UserProfile.of(user),
+    })
+
+
+@conditional_page(user_page_version)
+async def auser_profile_view(request: HttpRequest, username: str) -> HttpResponse:
+    user = await aget_object_or_404(User.objects.select_related('userprofile'), username=username)
+    recipes, next_cursor = await arecipes_page(RecipeSummary.objects.filter(author=user), request.GET.get('after'))
+    return await arender(request, 'recipes/user_profile.html', {
+        'recipes': recipes,
+        'next_cursor': next_cursor,
         'profile_user': user,
-        'profile': profile,
+        'profile': await sync_to_async(UserProfile.of)(user),
     })
 
 
@@ -140,3 +306,17 @@ def register_view(request: HttpRequest) -> HttpResponse:
     else:
         form = RegisterForm()
     return render(request, 'recipes/register.html', {'form': form})
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    """
+    Метрики производительности в текстовом формате Prometheus.
+
+    Доступ — с заголовком `Authorization: Bearer <METRICS_TOKEN>` или сотрудникам сайта:
+    закрытия /metrics/ в nginx недостаточно, если Django доступен в обход него.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(authorization, f'Bearer {token}')) and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')